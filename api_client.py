@@ -1,11 +1,35 @@
 import time
 import urllib.parse
 import requests
-from config import API_BASE
+from concurrent.futures import ThreadPoolExecutor
+from config import API_BASE, EPISODE_PAGE_WORKERS, EPISODE_PAGE_RETRIES
+from search_index import get_search_cache, get_title_index
+from metrics import RETRIES
 
 
-def search_anime(sm, query: str, max_retries=3):
-    """Search for anime with retry logic for better reliability"""
+class EpisodeListIncomplete(Exception):
+    """Some m=release pages still failed after their retries, so the episode list has gaps"""
+
+    def __init__(self, anime_session, pages):
+        self.anime_session = anime_session
+        self.pages = pages
+        super().__init__(f"Episode list for {anime_session} is incomplete: page(s) "
+                         f"{', '.join(map(str, pages))} failed after retries")
+
+
+def search_anime(sm, query: str, max_retries=3, use_cache=True):
+    """
+    Search for anime with retry logic for better reliability. Results are
+    cached per normalized query and added to the local title index, so the API
+    is only called on a cache miss or stale entry.
+    """
+    cache = get_search_cache()
+    if use_cache:
+        cached = cache.get(query)
+        if cached is not None:
+            print(f"⚡ Search cache hit for '{query}' ({len(cached)} results)")
+            return cached
+
     q = urllib.parse.quote_plus(query)
     url = f"{API_BASE}?m=search&q={q}"
     
@@ -17,24 +41,29 @@ def search_anime(sm, query: str, max_retries=3):
             data = r.json()
             results = data.get("data", [])
             print(f"✅ Search successful! Found {len(results)} results")
+            cache.put(query, results)
+            get_title_index().add(results)
             return results
             
         except requests.exceptions.ConnectTimeout as e:
             print(f"⚠️ Connection timeout (attempt {attempt + 1}/{max_retries}): {e}")
             if attempt == max_retries - 1:
                 raise Exception(f"Failed to connect to animepahe.ru after {max_retries} attempts. The site may be temporarily unavailable.")
+            RETRIES.inc(operation="search", cause="timeout")
             time.sleep(2 ** attempt)  # Exponential backoff
             
         except requests.exceptions.ConnectionError as e:
             print(f"⚠️ Connection error (attempt {attempt + 1}/{max_retries}): {e}")
             if attempt == max_retries - 1:
                 raise Exception(f"Cannot connect to animepahe.ru. Please check your internet connection or try again later.")
+            RETRIES.inc(operation="search", cause="connection")
             time.sleep(2 ** attempt)
             
         except requests.exceptions.RequestException as e:
             print(f"⚠️ Request error (attempt {attempt + 1}/{max_retries}): {e}")
             if attempt == max_retries - 1:
                 raise Exception(f"API request failed: {str(e)}")
+            RETRIES.inc(operation="search", cause="request")
             time.sleep(2 ** attempt)
             
         except Exception as e:
@@ -44,27 +73,59 @@ def search_anime(sm, query: str, max_retries=3):
     return []
 
 
-def get_all_episodes(sm, anime_session: str):
-    episodes = []
-    page = 1
-    while True:
-        url = f"{API_BASE}?m=release&id={anime_session}&sort=episode_asc&page={page}"
+def _fetch_release_page(sm, anime_session: str, page: int, max_retries=None):
+    """Fetch one m=release page, retrying just this page on errors"""
+    if max_retries is None:
+        max_retries = EPISODE_PAGE_RETRIES
+    url = f"{API_BASE}?m=release&id={anime_session}&sort=episode_asc&page={page}"
+    for attempt in range(max_retries):
         print(f"📄 Fetching page {page} -> {url}")
-        r = sm.get(url, timeout=30)
-        if r.status_code != 200:
-            print(f"⚠️ page {page} -> HTTP {r.status_code}; stopping.")
-            break
-        data = r.json()
-        chunk = data.get("data", [])
-        if not chunk:
-            break
-        print(f"   Retrieved {len(chunk)} episodes on page {page}")
-        episodes.extend(chunk)
-        last_page = data.get("last_page")
-        if last_page and page >= int(last_page):
-            break
-        page += 1
-        time.sleep(0.75)
-    return episodes
+        try:
+            r = sm.get(url, timeout=30)
+            if r.status_code == 200:
+                return r.json()
+            print(f"⚠️ page {page} -> HTTP {r.status_code} (attempt {attempt + 1}/{max_retries})")
+            cause = "http_status"
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"⚠️ page {page} -> {type(e).__name__}: {e} (attempt {attempt + 1}/{max_retries})")
+            cause = "request" if isinstance(e, requests.exceptions.RequestException) else "bad_json"
+        if attempt < max_retries - 1:
+            RETRIES.inc(operation="release_page", cause=cause)
+            time.sleep(2 ** attempt)
+    return None
 
 
+def get_all_episodes(sm, anime_session: str):
+    """
+    Every episode of a series, fetching pages after the first concurrently.
+    Raises EpisodeListIncomplete if any page fails after its retries, rather
+    than returning a list with silent gaps.
+    """
+    first = _fetch_release_page(sm, anime_session, 1)
+    if first is None:
+        raise EpisodeListIncomplete(anime_session, [1])
+    if not first.get("data"):
+        return []
+    pages = {1: first["data"]}
+    print(f"   Retrieved {len(first['data'])} episodes on page 1")
+
+    last_page = int(first.get("last_page") or 1)
+    failed = []
+    if last_page > 1:
+        with ThreadPoolExecutor(max_workers=min(EPISODE_PAGE_WORKERS, last_page - 1)) as executor:
+            remaining = range(2, last_page + 1)
+            for page, data in zip(remaining, executor.map(lambda p: _fetch_release_page(sm, anime_session, p), remaining)):
+                if data is None:
+                    print(f"⚠️ page {page} failed after retries; its episodes are missing.")
+                    failed.append(page)
+                    continue
+                chunk = data.get("data", [])
+                print(f"   Retrieved {len(chunk)} episodes on page {page}")
+                pages[page] = chunk
+
+    if failed:
+        raise EpisodeListIncomplete(anime_session, failed)
+
+    episodes = [ep for page in sorted(pages) for ep in pages[page]]
+    episodes.sort(key=lambda ep: ep.get("episode", 0))
+    return episodes
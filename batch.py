@@ -1,12 +1,68 @@
+import argparse
+import atexit
+import json
+import sys
 from session_mgr import SessionManager
-from api_client import search_anime, get_all_episodes
+from api_client import search_anime, get_all_episodes, EpisodeListIncomplete
 from scraper import scrape_download_links
-from resolver import resolve_download_info, resolve_download_url
-from transfer import download_with_progress, advanced_download_with_progress
+from pipeline import run_episode_pipeline
+from batch_queue import select_episodes, run_batch
+from config import METRICS_DUMP_PATH
+from metrics import dump_json
 
 
-def main():
+def load_jobs(sm, path):
+    """
+    Read a JSON list of jobs. Each names a series by "anime_session" or by a
+    search "query" (first result wins), plus optional "episodes" ("all", "1-12",
+    "1,5,9" or a list), "quality", "language" and "download_directory".
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    jobs = []
+    for entry in entries:
+        job = dict(entry)
+        if not job.get("anime_session"):
+            results = search_anime(sm, job.get("query", ""))
+            if not results:
+                print(f"⚠️ No results for {job.get('query')!r}, skipping")
+                continue
+            job["anime_session"] = results[0]["session"]
+            job.setdefault("title", results[0].get("title"))
+            print(f"🔎 {job['query']!r} -> {job['title']}")
+        jobs.append(job)
+    return jobs
+
+
+def run_jobs(sm, path):
+    """Non-interactive mode: download every job in `path` through one shared, deduplicated queue"""
+    jobs = load_jobs(sm, path)
+    if not jobs:
+        print("No jobs to run.")
+        return 1
+    plan, outcome = run_batch(sm, jobs)
+    failed = 0
+    for entry in plan:
+        name = entry["job"].get("title") or entry["job"]["anime_session"]
+        if entry["error"]:
+            print(f"❌ {name}: {entry['error']}")
+            failed += 1
+            continue
+        ok = sum(1 for key in entry["keys"] if outcome.get(key))
+        print(f"📦 {name}: {ok}/{len(entry['keys'])} episodes")
+        failed += ok < len(entry["keys"])
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-download anime episodes")
+    parser.add_argument("--jobs", help="JSON file of jobs to run without prompting")
+    args = parser.parse_args(argv)
+    if METRICS_DUMP_PATH:
+        atexit.register(dump_json, METRICS_DUMP_PATH)
     sm = SessionManager()
+    if args.jobs:
+        return run_jobs(sm, args.jobs)
     query = input("Enter anime name: ").strip()
     if not query:
         print("No query entered.")
@@ -31,23 +87,20 @@ def main():
     selected = results[idx]
     anime_session = selected["session"]
     print(f"\n📺 Fetching episodes for: {selected['title']} (session={anime_session})…")
-    eps = get_all_episodes(sm, anime_session)
+    try:
+        eps = get_all_episodes(sm, anime_session)
+    except EpisodeListIncomplete as e:
+        print(f"❌ {e}")
+        return
     print(f"✅ Total episodes fetched: {len(eps)}")
     selection = input("\nEnter episode selection (all, 1-20, 5,10,15): ").strip().lower()
-    if selection == "all":
-        chosen_eps = eps
-    elif "-" in selection:
-        start, end = map(int, selection.split("-"))
-        chosen_eps = [e for e in eps if start <= e["episode"] <= end]
-    else:
-        nums = [int(x) for x in selection.split(",") if x.isdigit()]
-        chosen_eps = [e for e in eps if e["episode"] in nums]
+    chosen_eps = select_episodes(eps, selection)
     print(f"📥 Selected {len(chosen_eps)} episodes for download.")
 
     # Scrape the first episode to detect available qualities/languages
     first_ep = chosen_eps[0]
     print(f"\n🔎 Checking available qualities for Episode {first_ep['episode']}...")
-    links = scrape_download_links(anime_session, first_ep["session"])
+    links = scrape_download_links(anime_session, first_ep["session"], sm=sm)
 
     if not links:
         print("⚠️ Could not detect available qualities, aborting.")
@@ -66,37 +119,21 @@ def main():
         print(f"Available languages for {q_choice}p:", ", ".join(available_langs))
         lang_choice = input(f"Enter language [{available_langs[0]}]: ").strip().lower() or available_langs[0]
 
-    for e in chosen_eps:
-        print(f"\n🎬 Episode {e['episode']}")
-        links = scrape_download_links(anime_session, e["session"])
-
-        raw_url = links.get(f"{q_choice}_{lang_choice}")
-        if not raw_url:
-            print(f"⚠️ {q_choice}p {lang_choice.upper()} not available for this episode.")
-            print("Available:", ", ".join(links.keys()))
-            continue
-
-        # Use the new advanced download system
-        download_info = resolve_download_info(raw_url)
-        if not download_info:
-            print("⚠️ Could not resolve download information.")
-            continue
-
-        # Use extracted filename or fallback to custom format
-        if not download_info.get('filename'):
-            download_info['filename'] = f"{selected['title']} - Ep{e['episode']}"
-
-        # Download with the advanced function
-        success = advanced_download_with_progress(download_info)
-        if success:
-            print(f"✅ Episode {e['episode']} downloaded successfully")
-        else:
-            print(f"❌ Failed to download Episode {e['episode']}")
+    results = run_episode_pipeline(
+        anime_session,
+        chosen_eps,
+        q_choice,
+        lang_choice,
+        filename_for=lambda ep: f"{selected['title']} - Ep{ep['episode']}",
+        sm=sm,
+    )
+    downloaded = sum(1 for _, success in results if success)
+    print(f"\n📦 Downloaded {downloaded}/{len(results)} episodes.")
 
 
 if __name__ == "__main__":
     try:
-        main()
+        sys.exit(main())
     except KeyboardInterrupt:
         print("\nBye.")
 
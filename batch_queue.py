@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+from api_client import get_all_episodes
+from pipeline import run_episode_pipeline
+from config import BATCH_SERIES_WORKERS
+
+
+def select_episodes(episodes, selection=None):
+    """
+    Episodes matching `selection`: None or "all", a "1-20" range, a "5,10,15"
+    string or a list of episode numbers.
+    """
+    if selection is None or (isinstance(selection, str) and selection.strip().lower() in ("", "all")):
+        return list(episodes)
+    if isinstance(selection, str):
+        selection = selection.strip()
+        if "-" in selection:
+            start, end = map(int, selection.split("-", 1))
+            return [e for e in episodes if start <= e["episode"] <= end]
+        selection = [int(x) for x in selection.split(",") if x.strip().isdigit()]
+    wanted = set(selection)
+    return [e for e in episodes if e["episode"] in wanted]
+
+
+def work_key(anime_session, episode_session, quality, language, download_directory):
+    """Identity of one unit of work; jobs asking for the same key share a single download"""
+    return f"{anime_session}/{episode_session}/{quality}_{language}@{download_directory}"
+
+
+def episode_filename(episode):
+    """
+    Fallback file name for a work item the resolver could not name. It carries
+    everything in the work key but the directory, so distinct items never share a file.
+    """
+    title = episode.get("title") or episode["anime_session"]
+    return f"{title} - Ep{episode['episode']} ({episode['quality']}p {episode['language']})"
+
+
+def plan_batch(sm, jobs, workers=None):
+    """
+    Expand jobs ({"anime_session", "episodes", "quality", "language",
+    "download_directory", "title"}) into unique work items. Each series' episode
+    list is fetched once, however many jobs name it.
+
+    Returns (work, plan): `work` maps work keys to episode dicts that carry their
+    own series, quality, language and directory (ready for run_episode_pipeline),
+    and `plan` has one {"job", "keys", "error"} entry per job, in job order.
+    """
+    sessions = list(dict.fromkeys(job["anime_session"] for job in jobs))
+    listings, errors = {}, {}
+
+    def fetch(anime_session):
+        try:
+            listings[anime_session] = get_all_episodes(sm, anime_session)
+        except Exception as e:
+            errors[anime_session] = str(e)
+
+    if sessions:
+        with ThreadPoolExecutor(max_workers=min(workers or BATCH_SERIES_WORKERS, len(sessions))) as executor:
+            list(executor.map(fetch, sessions))
+
+    work, plan = {}, []
+    for job in jobs:
+        anime_session = job["anime_session"]
+        quality = job.get("quality") or "720"
+        language = job.get("language") or "eng"
+        directory = job.get("download_directory") or "./"
+        if anime_session in errors:
+            plan.append({"job": job, "keys": [], "error": f"Could not list episodes: {errors[anime_session]}"})
+            continue
+        keys = []
+        for episode in select_episodes(listings.get(anime_session, []), job.get("episodes")):
+            key = work_key(anime_session, episode["session"], quality, language, directory)
+            if key not in work:
+                work[key] = {
+                    **episode,
+                    "key": key,
+                    "anime_session": anime_session,
+                    "quality": quality,
+                    "language": language,
+                    "download_directory": directory,
+                    "title": job.get("title") or anime_session,
+                }
+            keys.append(key)
+        keys = list(dict.fromkeys(keys))
+        plan.append({"job": job, "keys": keys, "error": None if keys else "No matching episodes found"})
+    return work, plan
+
+
+def run_batch(sm, jobs, filename_for=None, on_done=None, cancel_token=None, **pipeline_options):
+    """
+    Download every job's episodes through one shared pipeline, each unique
+    episode once. Returns (plan, outcome) where `outcome` maps work keys to
+    success, so callers can report per job.
+    """
+    work, plan = plan_batch(sm, jobs)
+    requested = sum(len(entry["keys"]) for entry in plan)
+    print(f"📦 {len(jobs)} jobs, {requested} episodes requested, {len(work)} unique")
+    if not work:
+        return plan, {}
+    results = run_episode_pipeline(
+        None, list(work.values()), None, None,
+        filename_for=filename_for or episode_filename,
+        on_done=on_done,
+        sm=sm,
+        cancel_token=cancel_token,
+        **pipeline_options,
+    )
+    return plan, {episode["key"]: success for episode, success in results}
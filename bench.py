@@ -0,0 +1,585 @@
+"""
+End-to-end throughput benchmark against a local animepahe/kwik stand-in.
+
+Starts a fake origin serving the search/release API, play pages, the
+intermediate + kwik pages and a range-capable file server with configurable
+bandwidth and latency, then runs the batch pipeline against it and writes
+episodes/hour, per-stage latency percentiles and peak RSS to a JSON file.
+
+    python bench.py --episodes 8 --file-size-mb 64 --output bench_results.json
+    python bench.py --baseline bench_results.json   # compare against an earlier run
+    python bench.py --copy-bench --file-size-mb 512  # CPU per GB of the transfer write path
+    python bench.py --tabs-bench --episodes 12 --tabs 4  # multi-tab vs one browser per episode
+    python bench.py --interception-bench --assets 20  # bytes/time saved by each CDP blocking profile
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_KWIK_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ+/"
+_KWIK_CHARSET = "GjRbWzqHk"
+_KWIK_BASE = 8
+_KWIK_OFFSET = 17
+_TOKEN = "bench-token"
+_QUALITIES = [("360", "jpn"), ("720", "jpn"), ("720", "eng"), ("1080", "eng")]
+
+
+def pack_kwik(markup):
+    """Inverse of resolver.decode_kwik_packed, used to serve a realistic kwik page"""
+    out = []
+    for ch in markup.encode("utf-8").decode("latin-1"):
+        value, digits = ord(ch) + _KWIK_OFFSET, ""
+        while value:
+            digits = _KWIK_ALPHABET[value % _KWIK_BASE] + digits
+            value //= _KWIK_BASE
+        out.append("".join(_KWIK_CHARSET[int(d)] for d in digits) + _KWIK_CHARSET[_KWIK_BASE])
+    return "".join(out)
+
+
+class FakeOrigin:
+    """Threaded HTTP server standing in for animepahe, pahe.win, kwik and the media CDN"""
+
+    def __init__(self, series=1, episodes=12, per_page=30, file_size=32 * 1024 * 1024,
+                 bandwidth=16 * 1024 * 1024, latency=0.02, assets=0, asset_size=64 * 1024):
+        self.series = series
+        self.episodes = episodes
+        self.per_page = per_page
+        self.file_size = file_size
+        self.bandwidth = bandwidth  # bytes per second per connection, 0 for unlimited
+        self.latency = latency
+        self.assets = assets  # images per page, plus a stylesheet, font and preview video when > 0
+        self.asset_size = asset_size
+        self._block = bytes(range(256)) * 256  # 64 KiB of deterministic payload
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.origin = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def series_session(self, index):
+        return f"bench-series-{index}"
+
+    def _handler(self):
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b"", content_type="text/html; charset=utf-8", headers=None):
+                if isinstance(body, str):
+                    body = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                time.sleep(origin.latency)
+                url = urllib.parse.urlparse(self.path)
+                query = urllib.parse.parse_qs(url.query)
+                if url.path == "/api":
+                    return self._api(query)
+                if url.path == "/":
+                    return self._send(200, f"<html><head>{origin.asset_tags()}</head><body>"
+                                           "<input type=\"search\"></body></html>")
+                if url.path.startswith("/assets/"):
+                    body = (origin._block * (origin.asset_size // len(origin._block) + 1))[:origin.asset_size]
+                    return self._send(200, body, content_type="application/octet-stream", headers={"Cache-Control": "no-store"})
+                match = re.match(r"^/play/([\w-]+)/([\w-]+)$", url.path)
+                if match:
+                    return self._send(200, origin.play_page(match.group(1), match.group(2)))
+                match = re.match(r"^/pahe/([\w-]+)$", url.path)
+                if match:
+                    return self._send(200, origin.intermediate_page(match.group(1)))
+                match = re.match(r"^/f/([\w-]+)$", url.path)
+                if match:
+                    return self._send(200, origin.kwik_page(match.group(1)),
+                                      headers={"Set-Cookie": "kwik_session=bench; Path=/"})
+                match = re.match(r"^/files/([\w-]+)\.mp4$", url.path)
+                if match:
+                    return self._file()
+                self._send(404, "not found")
+
+            def do_POST(self):
+                time.sleep(origin.latency)
+                length = int(self.headers.get("Content-Length", 0))
+                form = urllib.parse.parse_qs(self.rfile.read(length).decode())
+                match = re.match(r"^/d/([\w-]+)$", self.path)
+                if not match or form.get("_token") != [_TOKEN]:
+                    return self._send(419, "token mismatch")
+                self._send(302, "", headers={"Location": f"{origin.origin}/files/{match.group(1)}.mp4"})
+
+            def _api(self, query):
+                mode = query.get("m", [""])[0]
+                if mode == "search":
+                    data = [{
+                        "id": i, "title": f"Bench Series {i}", "type": "TV", "episodes": origin.episodes,
+                        "status": "Finished Airing", "season": "Fall", "year": 2024, "score": 8.0,
+                        "poster": "", "session": origin.series_session(i),
+                    } for i in range(origin.series)]
+                    body = {"total": len(data), "data": data}
+                elif mode == "release":
+                    page = int(query.get("page", ["1"])[0])
+                    last_page = max(1, -(-origin.episodes // origin.per_page))
+                    first = (page - 1) * origin.per_page + 1
+                    numbers = range(first, min(first + origin.per_page, origin.episodes + 1))
+                    body = {
+                        "total": origin.episodes, "per_page": origin.per_page, "current_page": page,
+                        "last_page": last_page,
+                        "data": [{"episode": n, "session": f"ep{n:04d}"} for n in numbers],
+                    }
+                else:
+                    body = {"data": []}
+                self._send(200, json.dumps(body), content_type="application/json")
+
+            def _file(self):
+                size = origin.file_size
+                start, end, status = 0, size - 1, 200
+                match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+                headers = {"Accept-Ranges": "bytes", "ETag": '"bench"'}
+                if match:
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                    status = 206
+                    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+                self.send_response(status)
+                self.send_header("Content-Type", "video/mp4")
+                self.send_header("Content-Length", str(end - start + 1))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                origin.stream(self.wfile, start, end)
+
+        return Handler
+
+    def stream(self, wfile, start, end):
+        """Write bytes [start, end] at no more than `bandwidth` bytes per second"""
+        position, began, sent = start, time.time(), 0
+        block = len(self._block)
+        try:
+            while position <= end:
+                offset = position % block
+                count = min(block - offset, end - position + 1)
+                wfile.write(self._block[offset:offset + count])
+                position += count
+                sent += count
+                if self.bandwidth:
+                    ahead = sent / self.bandwidth - (time.time() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def asset_tags(self):
+        """Images, a stylesheet, a font and a preview video, like the real pages carry"""
+        if not self.assets:
+            return ""
+        tags = [
+            '<link rel="stylesheet" href="/assets/site.css">',
+            '<link rel="preload" as="font" type="font/woff2" href="/assets/site.woff2" crossorigin>',
+            '<video src="/assets/preview.webm" preload="auto" muted></video>',
+        ]
+        tags += [f'<img src="/assets/thumb{i}.jpg">' for i in range(self.assets)]
+        return "".join(tags)
+
+    def play_page(self, anime_session, episode_session):
+        anchors = "\n".join(
+            f'<a href="{self.origin}/pahe/{episode_session}-{q}{lang}" class="dropdown-item" target="_blank">'
+            f'<span class="badge badge-secondary">Bench</span> &middot; {q}p (100MB) '
+            + (f'<span class="badge badge-warning text-uppercase">{lang}</span>' if lang != "jpn" else "")
+            + "</a>"
+            for q, lang in _QUALITIES
+        )
+        return (
+            f"<html><head>{self.asset_tags()}</head><body><div class=\"dropdown\">"
+            "<button id=\"downloadMenu\" class=\"btn dropdown-toggle\">Download</button>"
+            f"<div id=\"pickDownload\" class=\"dropdown-menu\">{anchors}</div>"
+            "</div></body></html>"
+        )
+
+    def intermediate_page(self, link_id):
+        return (
+            "<html><body><a href=\"\" class=\"redirect\">Continue</a>"
+            f"<script>$(\"a.redirect\").attr(\"href\",\"{self.origin}/f/{link_id}\")</script>"
+            "</body></html>"
+        )
+
+    def kwik_page(self, link_id):
+        form = (
+            f'<form action="{self.origin}/d/{link_id}" method="POST">'
+            f'<input type="hidden" name="_token" value="{_TOKEN}">'
+            '<button type="submit">Download</button></form>'
+        )
+        packed = pack_kwik(form)
+        return (
+            f"<html><head>{self.asset_tags()}</head><body><h1 class=\"title\">Bench {link_id}.mp4</h1>"
+            f"<script>eval(function(h,u,n,t,e,r){{}}(\"{packed}\",{len(packed) % 97},"
+            f"\"{_KWIK_CHARSET}\",{_KWIK_OFFSET},{_KWIK_BASE},{len(packed) % 31}))</script>"
+            "</body></html>"
+        )
+
+
+def percentiles(values, points=(50, 90, 99)):
+    if not values:
+        return {f"p{p}": None for p in points}
+    ordered = sorted(values)
+    return {f"p{p}": ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] for p in points}
+
+
+def peak_rss_mb():
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"self": self_kb / 1024, "children": children_kb / 1024}
+
+
+def process_tree_rss_mb(root_pid):
+    """Resident memory of `root_pid` and all of its descendants (Chrome, chromedriver), from /proc"""
+    parents, rss_pages = {}, {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        parents[int(name)] = int(fields[1])
+        rss_pages[int(name)] = int(fields[21])
+    tree, grew = {root_pid}, True
+    while grew:
+        children = {pid for pid, ppid in parents.items() if ppid in tree} - tree
+        tree |= children
+        grew = bool(children)
+    return sum(rss_pages.get(pid, 0) for pid in tree) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+
+
+class RssSampler:
+    """Tracks the peak process-tree RSS in a background thread while a `with` block runs"""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak_mb = None
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                current = process_tree_rss_mb(os.getpid())
+            except OSError:
+                return  # No /proc on this platform
+            self.peak_mb = max(self.peak_mb or 0, current)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_benchmark(args):
+    fake = FakeOrigin(
+        series=args.series,
+        episodes=args.episodes,
+        file_size=int(args.file_size_mb * 1024 * 1024),
+        bandwidth=int(args.bandwidth_mbps * 1024 * 1024),
+        latency=args.latency_ms / 1000,
+    ).start()
+    work_dir = tempfile.mkdtemp(prefix="anime_dl_bench_")
+
+    # Modules read the origin and data directory at import time
+    os.environ["ANIMEPAHE_ORIGIN"] = fake.origin
+    os.environ["ANIME_DL_DATA_DIR"] = os.path.join(work_dir, "state")
+    import config
+    if args.segments is not None:
+        config.TRANSFER_SEGMENTS = args.segments
+    from cookie_store import save_clearance
+    from session_mgr import SessionManager, DEFAULT_USER_AGENT
+    from api_client import search_anime, get_all_episodes
+    import pipeline
+    from metrics import REGISTRY
+
+    # Seed a clearance so SessionManager starts without a browser, as it would after a restart
+    save_clearance([{"name": "__ddg1_", "value": "bench", "domain": "127.0.0.1", "path": "/"}], DEFAULT_USER_AGENT)
+
+    print(f"🏁 Fake origin at {fake.origin}, output in {work_dir}")
+    started = time.time()
+    sm = SessionManager()
+    results = search_anime(sm, "bench")
+    stage_timings = {}
+    succeeded = total = 0
+    for series in results:
+        episodes = get_all_episodes(sm, series["session"])
+        timings = {}
+        outcome = pipeline.run_episode_pipeline(
+            series["session"], episodes, args.quality, args.language,
+            download_directory=work_dir,
+            sm=sm,
+            timings=timings,
+            scrape_workers=args.scrape_workers,
+            resolve_workers=args.resolve_workers,
+            transfer_workers=args.transfer_workers,
+        )
+        for stage, values in timings.items():
+            stage_timings.setdefault(stage, []).extend(values)
+        total += len(outcome)
+        succeeded += sum(1 for _, ok in outcome if ok)
+    wall = time.time() - started
+    fake.stop()
+
+    report = {
+        "timestamp": time.time(),
+        "params": vars(args),
+        "wall_seconds": wall,
+        "episodes": total,
+        "episodes_ok": succeeded,
+        "episodes_per_hour": succeeded / wall * 3600 if wall > 0 else 0,
+        "bytes_per_second": succeeded * fake.file_size / wall if wall > 0 else 0,
+        "stages": {stage: {"count": len(values), **percentiles(values)} for stage, values in stage_timings.items()},
+        "peak_rss_mb": peak_rss_mb(),
+        "metrics": REGISTRY.to_dict(),
+    }
+    return report
+
+
+def run_copy_benchmark(args):
+    """
+    CPU time per GB of the original 1 KiB iter_content loop against
+    transfer.copy_stream, both downloading from the fake origin at full speed
+    into /dev/null. Thread CPU time is used so the server threads don't count.
+    """
+    import requests
+    from transfer import copy_stream
+    from config import TRANSFER_BUFFER_SIZE
+
+    fake = FakeOrigin(file_size=int(args.file_size_mb * 1024 * 1024), bandwidth=0, latency=0).start()
+    url = f"{fake.origin}/files/bench.mp4"
+    buffer_size = int(args.buffer_kb * 1024) if args.buffer_kb else TRANSFER_BUFFER_SIZE
+
+    def legacy(response, file):
+        for chunk in response.iter_content(chunk_size=1024):
+            if chunk:
+                file.write(chunk)
+
+    def buffered(response, file):
+        copy_stream(response, file, bytearray(buffer_size))
+
+    results = {}
+    for name, copy in (("iter_content_1k", legacy), ("copy_stream", buffered)):
+        with requests.get(url, stream=True) as response, open(os.devnull, "wb") as file:
+            response.raise_for_status()
+            cpu, wall = time.thread_time(), time.time()
+            copy(response, file)
+            cpu, wall = time.thread_time() - cpu, time.time() - wall
+        gigabytes = fake.file_size / 1024 ** 3
+        results[name] = {
+            "cpu_seconds_per_gb": cpu / gigabytes,
+            "wall_seconds": wall,
+            "bytes_per_second": fake.file_size / wall if wall > 0 else 0,
+        }
+        print(f"   {name}: {cpu / gigabytes:.2f} CPU s/GB, {fake.file_size / wall / 1024 ** 2:.0f} MB/s")
+    fake.stop()
+    return {"timestamp": time.time(), "params": vars(args), "buffer_size": buffer_size, "copy": results}
+
+
+def run_tabs_benchmark(args):
+    """
+    Episodes per minute and peak RSS of scraping play pages with a fresh Chrome
+    per episode (the original approach) against SCRAPER_TABS tabs in one Chrome.
+    """
+    fake = FakeOrigin(episodes=args.episodes, latency=args.latency_ms / 1000).start()
+    os.environ["ANIME_DL_DATA_DIR"] = tempfile.mkdtemp(prefix="anime_dl_bench_")
+    from browser import create_stealth_driver, cleanup_browser_data
+    from scraper import _scrape_play_page, scrape_play_pages_tabs
+    from config import SCRAPER_TABS
+    tabs = args.tabs or SCRAPER_TABS
+    urls = [f"{fake.origin}/play/{fake.series_session(0)}/ep{n:04d}" for n in range(1, args.episodes + 1)]
+
+    def quit_driver(driver):
+        try:
+            driver.quit()
+        finally:
+            cleanup_browser_data(driver)
+
+    def per_episode():
+        scraped = 0
+        for url in urls:
+            driver = create_stealth_driver()
+            try:
+                scraped += bool(_scrape_play_page(driver, url))
+            finally:
+                quit_driver(driver)
+        return scraped
+
+    def multi_tab():
+        driver = create_stealth_driver()
+        try:
+            return sum(1 for _, links, _ in scrape_play_pages_tabs(driver, urls, tabs=tabs) if links)
+        finally:
+            quit_driver(driver)
+
+    results = {}
+    for name, scrape in (("browser_per_episode", per_episode), (f"tabs_{tabs}", multi_tab)):
+        with RssSampler() as rss:
+            wall = time.time()
+            scraped = scrape()
+            wall = time.time() - wall
+        results[name] = {
+            "episodes_ok": scraped,
+            "wall_seconds": wall,
+            "episodes_per_minute": scraped / wall * 60 if wall > 0 else 0,
+            "peak_rss_mb": rss.peak_mb,
+        }
+        peak = f"{rss.peak_mb:.0f}MB" if rss.peak_mb is not None else "n/a"
+        print(f"   {name}: {scraped}/{len(urls)} episodes, {results[name]['episodes_per_minute']:.1f}/min, "
+              f"peak RSS {peak}")
+    fake.stop()
+    return {"timestamp": time.time(), "params": vars(args), "tabs": tabs, "scrape": results}
+
+
+# Bytes fetched, request count and load time of the current page, from Navigation/Resource Timing
+_PAGE_WEIGHT_SCRIPT = """
+var nav = performance.getEntriesByType('navigation')[0] || {};
+var bytes = nav.transferSize || 0;
+var resources = performance.getEntriesByType('resource');
+resources.forEach(function (r) { bytes += r.transferSize || 0; });
+return {bytes: bytes, requests: resources.length + 1, load_seconds: (nav.loadEventEnd || 0) / 1000};
+"""
+
+
+def run_interception_benchmark(args):
+    """
+    Load the fake play, kwik and home (DDoS clear) pages with no blocking and
+    with their interception profile, and report bytes and load time saved.
+    """
+    fake = FakeOrigin(latency=args.latency_ms / 1000, assets=args.assets or 20).start()
+    os.environ["ANIME_DL_DATA_DIR"] = tempfile.mkdtemp(prefix="anime_dl_bench_")
+    from browser import create_stealth_driver, cleanup_browser_data, apply_interception, wait_for, network_idle
+    pages = {
+        "play": f"{fake.origin}/play/{fake.series_session(0)}/ep0001",
+        "kwik": f"{fake.origin}/f/ep0001-720eng",
+        "ddos": f"{fake.origin}/",
+    }
+    repeat = max(1, args.repeat)
+
+    driver = create_stealth_driver()
+    results = {}
+    try:
+        for profile, url in pages.items():
+            runs = {}
+            for label, applied in (("unblocked", None), ("profile", profile)):
+                apply_interception(driver, applied)
+                samples = []
+                for _ in range(repeat):
+                    driver.get("about:blank")
+                    driver.get(url)
+                    wait_for(driver, network_idle(quiet=0.3), 10, "bench_idle", required=False)
+                    samples.append(driver.execute_script(_PAGE_WEIGHT_SCRIPT))
+                runs[label] = {
+                    key: sorted(sample[key] for sample in samples)[len(samples) // 2]
+                    for key in ("bytes", "requests", "load_seconds")
+                }
+            before, after = runs["unblocked"], runs["profile"]
+            runs["bytes_saved"] = before["bytes"] - after["bytes"]
+            runs["seconds_saved"] = before["load_seconds"] - after["load_seconds"]
+            results[profile] = runs
+            print(f"   {profile}: {before['bytes'] / 1024:.0f}KB -> {after['bytes'] / 1024:.0f}KB, "
+                  f"{before['load_seconds']:.2f}s -> {after['load_seconds']:.2f}s")
+    finally:
+        apply_interception(driver, None)
+        driver.quit()
+        cleanup_browser_data(driver)
+        fake.stop()
+    return {"timestamp": time.time(), "params": vars(args), "interception": results}
+
+
+def compare(report, baseline):
+    """Print relative change of the headline numbers against an earlier report"""
+    def delta(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+    print("\n📊 Against baseline:")
+    print(f"   episodes/hour: {report['episodes_per_hour']:.1f} ({delta(report['episodes_per_hour'], baseline['episodes_per_hour'])})")
+    for stage, stats in report["stages"].items():
+        old = baseline.get("stages", {}).get(stage, {})
+        if stats.get("p50") is not None and old.get("p50"):
+            print(f"   {stage} p50: {stats['p50']:.3f}s ({delta(stats['p50'], old['p50'])})")
+    print(f"   peak RSS: {report['peak_rss_mb']['self']:.1f}MB "
+          f"({delta(report['peak_rss_mb']['self'], baseline['peak_rss_mb']['self'])})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the download pipeline against a local fake origin")
+    parser.add_argument("--series", type=int, default=1)
+    parser.add_argument("--episodes", type=int, default=6)
+    parser.add_argument("--file-size-mb", type=float, default=32)
+    parser.add_argument("--bandwidth-mbps", type=float, default=16, help="MB/s per connection, 0 for unlimited")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--quality", default="720")
+    parser.add_argument("--language", default="eng")
+    parser.add_argument("--segments", type=int, default=None)
+    parser.add_argument("--scrape-workers", type=int, default=None)
+    parser.add_argument("--resolve-workers", type=int, default=None)
+    parser.add_argument("--transfer-workers", type=int, default=None)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="Earlier report to compare against")
+    parser.add_argument("--copy-bench", action="store_true", help="Only measure CPU cost of the write path")
+    parser.add_argument("--buffer-kb", type=float, default=None, help="copy_stream buffer size for --copy-bench")
+    parser.add_argument("--tabs-bench", action="store_true", help="Only compare multi-tab and per-episode scraping")
+    parser.add_argument("--tabs", type=int, default=None, help="Worker tabs for --tabs-bench")
+    parser.add_argument("--interception-bench", action="store_true",
+                        help="Only measure page bytes and load time with and without blocking profiles")
+    parser.add_argument("--assets", type=int, default=None, help="Images per fake page for --interception-bench")
+    parser.add_argument("--repeat", type=int, default=3, help="Page loads per case for --interception-bench")
+    args = parser.parse_args(argv)
+
+    standalone = {
+        "copy_bench": run_copy_benchmark,
+        "tabs_bench": run_tabs_benchmark,
+        "interception_bench": run_interception_benchmark,
+    }
+    for flag, run in standalone.items():
+        if not getattr(args, flag):
+            continue
+        report = run(args)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report written to {args.output}")
+        return 0
+
+    report = run_benchmark(args)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ {report['episodes_ok']}/{report['episodes']} episodes in {report['wall_seconds']:.1f}s "
+          f"({report['episodes_per_hour']:.1f} episodes/hour), report written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+    return 0 if report["episodes_ok"] == report["episodes"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
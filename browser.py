@@ -1,20 +1,32 @@
 import time
-import random
 import uuid
 import tempfile
 import os
+import queue
 import threading
+import atexit
+from contextlib import contextmanager
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import (
-    ElementClickInterceptedException,
-    TimeoutException,
+from selenium.common.exceptions import TimeoutException
+from config import (
+    RESOURCE_TYPE_PATTERNS,
+    INTERCEPTION_PROFILES,
+    BROWSER_MAX_RETRIES,
+    BROWSER_READY_TIMEOUT,
+    BROWSER_CLEANUP_TIMEOUT,
+    BROWSER_WAIT_POLL,
+    CLICK_SETTLE_TIMEOUT,
+    BROWSER_RETRY_DELAY,
+    BROWSER_POOL_SIZE,
+    BROWSER_POOL_MAX_USES,
+    BROWSER_POOL_CHECKOUT_TIMEOUT,
+    BASE_ORIGIN,
 )
-from config import AD_BLOCK_PATTERNS, BROWSER_MAX_RETRIES, BROWSER_CREATION_DELAY, BROWSER_CLEANUP_DELAY, BROWSER_RETRY_DELAY
+from cookie_store import get_clearance_jar, cookie_key
+from metrics import BROWSER_CREATE_SECONDS, BROWSER_WAIT_SECONDS, RETRIES, POOL_OCCUPANCY, REGISTRY
 
 try:
     import undetected_chromedriver as uc  # type: ignore
@@ -22,6 +34,45 @@ try:
 except Exception:
     HAS_UC = False
 
+def wait_for(driver, condition, timeout, step, required=True):
+    """
+    Poll `condition(driver)` every BROWSER_WAIT_POLL seconds until it returns
+    something truthy, recording how long `step` took. Raises TimeoutException,
+    or returns None when the wait is not `required`.
+    """
+    started = time.monotonic()
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=BROWSER_WAIT_POLL).until(condition)
+    except TimeoutException:
+        if required:
+            raise
+        return None
+    finally:
+        BROWSER_WAIT_SECONDS.observe(time.monotonic() - started, step=step)
+
+
+class network_idle:
+    """
+    Condition: the document has loaded and no new resource has been fetched
+    for `quiet` seconds, judged from the Resource Timing entries.
+    """
+
+    def __init__(self, quiet=0.5):
+        self.quiet = quiet
+        self._count = None
+        self._since = None
+
+    def __call__(self, driver):
+        state, count = driver.execute_script(
+            "return [document.readyState, performance.getEntriesByType('resource').length];"
+        )
+        now = time.monotonic()
+        if state != "complete" or count != self._count:
+            self._count, self._since = count, now
+            return False
+        return now - self._since >= self.quiet
+
+
 # Global lock to prevent multiple browser instances from being created simultaneously
 _browser_lock = threading.Lock()
 
@@ -32,6 +83,7 @@ def create_stealth_driver(headless=True, max_retries=None):
     
     with _browser_lock:  # Ensure only one browser instance is created at a time
         for attempt in range(max_retries):
+            started = time.monotonic()
             try:
                 # Create unique user data directory for this browser instance
                 unique_id = str(uuid.uuid4())[:8]
@@ -52,7 +104,6 @@ def create_stealth_driver(headless=True, max_retries=None):
                     opts.add_argument("--disable-gpu")
                     opts.add_argument("--disable-extensions")
                     opts.add_argument("--disable-plugins")
-                    opts.add_argument("--disable-images")  # Speed up loading
                     # Add additional options to prevent conflicts
                     opts.add_argument("--disable-background-timer-throttling")
                     opts.add_argument("--disable-backgrounding-occluded-windows")
@@ -76,7 +127,6 @@ def create_stealth_driver(headless=True, max_retries=None):
                         opts.add_argument("--disable-gpu")
                         opts.add_argument("--disable-extensions")
                         opts.add_argument("--disable-plugins")
-                        opts.add_argument("--disable-images")
                         # Add additional options to prevent conflicts
                         opts.add_argument("--disable-background-timer-throttling")
                         opts.add_argument("--disable-backgrounding-occluded-windows")
@@ -98,7 +148,6 @@ def create_stealth_driver(headless=True, max_retries=None):
                     opts.add_argument("--disable-gpu")
                     opts.add_argument("--disable-extensions")
                     opts.add_argument("--disable-plugins")
-                    opts.add_argument("--disable-images")  # Speed up loading
                     # Add additional options to prevent conflicts
                     opts.add_argument("--disable-background-timer-throttling")
                     opts.add_argument("--disable-backgrounding-occluded-windows")
@@ -117,28 +166,94 @@ def create_stealth_driver(headless=True, max_retries=None):
                 # Store the user data directory path for cleanup
                 setattr(driver, '_user_data_dir', user_data_dir)
                 
-                # Add a small delay to ensure the browser is fully initialized
-                time.sleep(BROWSER_CREATION_DELAY)
+                # The browser is usable once it answers scripts
+                wait_for(driver, lambda d: d.execute_script("return 1;") == 1, BROWSER_READY_TIMEOUT, "browser_ready")
+                BROWSER_CREATE_SECONDS.observe(time.monotonic() - started)
                 
                 return driver
                 
             except Exception as e:
                 print(f"⚠️ Browser creation attempt {attempt + 1} failed: {e}")
                 if attempt < max_retries - 1:
+                    RETRIES.inc(operation="browser_create", cause="launch_failed")
                     print(f"⏳ Retrying in {BROWSER_RETRY_DELAY} seconds...")
                     time.sleep(BROWSER_RETRY_DELAY)
                 else:
                     raise Exception(f"Failed to create browser instance after {max_retries} attempts: {e}")
 
 
-def set_adblock(driver, enabled: bool):
+def interception_patterns(profile):
+    """URL patterns blocked by the named INTERCEPTION_PROFILES entry"""
+    spec = INTERCEPTION_PROFILES[profile]
+    patterns = []
+    for resource_type in spec.get("types", ()):
+        patterns.extend(RESOURCE_TYPE_PATTERNS.get(resource_type, ()))
+    patterns.extend(spec.get("urls", ()))
+    return list(dict.fromkeys(patterns))
+
+
+def apply_interception(driver, profile):
+    """
+    Block the requests the current tab's next page doesn't need, per a named
+    profile ("play", "kwik", "ddos"), or lift all blocking with None. Blocking
+    is per tab, so apply it again after opening or switching to a new one.
+    """
+    urls = interception_patterns(profile) if profile else []
     try:
         driver.execute_cdp_cmd("Network.enable", {})
-        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": AD_BLOCK_PATTERNS if enabled else []})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": urls})
     except Exception:
         pass
 
 
+def inject_clearance(driver):
+    """
+    Load the shared clearance cookies into `driver` over CDP, so its first
+    navigation already carries them, and remember what was injected.
+    """
+    snapshot = get_clearance_jar().snapshot()
+    cookies = snapshot["cookies"] if snapshot else []
+    params = []
+    for c in cookies:
+        cookie = {"name": c["name"], "value": c["value"], "path": c.get("path") or "/"}
+        if c.get("domain"):
+            cookie["domain"] = c["domain"]
+        else:
+            cookie["url"] = BASE_ORIGIN
+        if c.get("expiry"):
+            cookie["expires"] = c["expiry"]
+        params.append(cookie)
+    if params:
+        try:
+            driver.execute_cdp_cmd("Network.setCookies", {"cookies": params})
+        except Exception as e:
+            print(f"⚠️ Could not inject clearance cookies: {e}")
+    setattr(driver, '_clearance_seen', {cookie_key(c): c["value"] for c in cookies})
+
+
+def harvest_clearance(driver):
+    """Write clearance cookies `driver` was issued since inject_clearance back to the shared jar"""
+    try:
+        cookies = driver.execute_cdp_cmd("Network.getAllCookies", {}).get("cookies", [])
+    except Exception:
+        return
+    seen = [
+        {
+            "name": c["name"],
+            "value": c["value"],
+            "domain": c.get("domain"),
+            "path": c.get("path"),
+            "expiry": int(c["expires"]) if c.get("expires", -1) > 0 else None,
+        }
+        for c in cookies
+    ]
+    try:
+        if get_clearance_jar().update(seen, since=getattr(driver, '_clearance_seen', {}), clearance_only=True):
+            print("🍪 Browser picked up fresher clearance cookies, shared them")
+    except OSError as e:
+        print(f"⚠️ Could not save clearance cookies: {e}")
+
+
 def close_new_tabs_and_return(driver, base_handle: str):
     try:
         handles = driver.window_handles
@@ -161,21 +276,30 @@ def cleanup_browser_data(driver):
             user_data_dir = getattr(driver, '_user_data_dir')
             if user_data_dir and os.path.exists(user_data_dir):
                 import shutil
-                # Add a small delay to ensure Chrome has fully released the directory
-                time.sleep(BROWSER_CLEANUP_DELAY)
-                shutil.rmtree(user_data_dir, ignore_errors=True)
+                # Chrome may still be writing as it exits; retry until the directory is gone
+                deadline = time.monotonic() + BROWSER_CLEANUP_TIMEOUT
+                while True:
+                    shutil.rmtree(user_data_dir, ignore_errors=True)
+                    if not os.path.exists(user_data_dir) or time.monotonic() > deadline:
+                        break
+                    time.sleep(BROWSER_WAIT_POLL)
                 print(f"🧹 Cleaned up browser data directory: {user_data_dir}")
     except Exception as e:
         print(f"⚠️ Failed to cleanup browser data: {e}")
 
 def guarded_click(driver, element, max_retries: int = 3):
+    """
+    Click `element`, closing any popup tab the click opens and trying again.
+    Instead of a fixed pause, waits up to CLICK_SETTLE_TIMEOUT for a new tab or
+    a navigation to show up.
+    """
     base = driver.current_window_handle
     for _ in range(max_retries):
         pre_handles = set(driver.window_handles)
+        pre_url = driver.current_url
         try:
             try:
                 driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
-                time.sleep(0.2)
             except Exception:
                 pass
             try:
@@ -187,13 +311,165 @@ def guarded_click(driver, element, max_retries: int = 3):
                 driver.execute_script("arguments[0].click();", element)
             except Exception:
                 pass
-        time.sleep(0.6 + random.uniform(0.1, 0.4))
+        wait_for(
+            driver,
+            lambda d: len(d.window_handles) > len(pre_handles) or d.current_url != pre_url,
+            CLICK_SETTLE_TIMEOUT, "click_settle", required=False,
+        )
         post_handles = set(driver.window_handles)
         if len(post_handles) > len(pre_handles):
             close_new_tabs_and_return(driver, base)
-            time.sleep(0.4)
             continue
         return True
     return False
 
 
+class DriverPool:
+    """Bounded pool of warm stealth drivers that are reused across scrapes and resolves"""
+
+    def __init__(self, size=None, max_uses=None, headless=True):
+        self.size = size if size is not None else BROWSER_POOL_SIZE
+        self.max_uses = max_uses if max_uses is not None else BROWSER_POOL_MAX_USES
+        self.headless = headless
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._live = 0  # drivers alive or being created
+        self._creating = 0
+        self._closed = False
+
+    def _fill(self):
+        """Start background creation until the pool holds `size` drivers"""
+        with self._lock:
+            missing = 0 if self._closed else self.size - self._live
+            self._live += max(missing, 0)
+            self._creating += max(missing, 0)
+        for _ in range(max(missing, 0)):
+            threading.Thread(target=self._create_worker, daemon=True).start()
+
+    def _create_worker(self):
+        try:
+            driver = create_stealth_driver(headless=self.headless)
+        except Exception as e:
+            print(f"⚠️ Pool browser creation failed: {e}")
+            with self._lock:
+                self._live -= 1
+                self._creating -= 1
+            return
+        with self._lock:
+            self._creating -= 1
+        setattr(driver, '_pool_uses', 0)
+        if self._closed:
+            self._retire(driver)
+            return
+        self._idle.put(driver)
+
+    def _is_healthy(self, driver):
+        try:
+            return driver.execute_script("return 1;") == 1 and bool(driver.window_handles)
+        except Exception:
+            return False
+
+    def _reset(self, driver):
+        """Bring a used driver back to a clean state: one tab, no cookies, no blocked URLs"""
+        handles = driver.window_handles
+        close_new_tabs_and_return(driver, handles[0])
+        try:
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        except Exception:
+            driver.delete_all_cookies()
+        apply_interception(driver, None)
+        driver.get("about:blank")
+
+    def _retire(self, driver):
+        with self._lock:
+            self._live -= 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        cleanup_browser_data(driver)
+
+    def checkout(self, timeout=None):
+        """Take a warm driver from the pool, waiting for background creation if needed"""
+        if timeout is None:
+            timeout = BROWSER_POOL_CHECKOUT_TIMEOUT
+        deadline = time.time() + timeout
+        while True:
+            self._fill()
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise Exception(f"Timed out after {timeout}s waiting for a browser from the pool")
+            try:
+                driver = self._idle.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if self._is_healthy(driver):
+                inject_clearance(driver)
+                return driver
+            print("⚠️ Pooled browser is unresponsive, retiring it")
+            self._retire(driver)
+
+    def checkin(self, driver):
+        """Return a driver to the pool, retiring it when it crashed or reached max uses"""
+        uses = getattr(driver, '_pool_uses', 0) + 1
+        setattr(driver, '_pool_uses', uses)
+        healthy = self._is_healthy(driver)
+        if healthy:
+            harvest_clearance(driver)
+        if self._closed or uses >= self.max_uses or not healthy:
+            self._retire(driver)
+            self._fill()
+            return
+        try:
+            self._reset(driver)
+        except Exception as e:
+            print(f"⚠️ Failed to reset pooled browser: {e}")
+            self._retire(driver)
+            self._fill()
+            return
+        self._idle.put(driver)
+
+    @contextmanager
+    def driver(self, timeout=None):
+        """Check out a driver for the duration of a `with` block"""
+        driver = self.checkout(timeout)
+        try:
+            yield driver
+        finally:
+            self.checkin(driver)
+
+    def stats(self):
+        with self._lock:
+            live, creating = self._live, self._creating
+        idle = self._idle.qsize()
+        return {"size": self.size, "idle": idle, "creating": creating, "in_use": max(live - creating - idle, 0)}
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._retire(driver)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool():
+    """Get or create the process-wide driver pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool()
+            _pool._fill()
+            atexit.register(_pool.close)
+            REGISTRY.add_collector(_collect_pool_metrics)
+        return _pool
+
+
+def _collect_pool_metrics():
+    for state, value in _pool.stats().items():
+        POOL_OCCUPANCY.set(value, pool="browser", state=state)
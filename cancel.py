@@ -0,0 +1,93 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class DownloadCancelled(Exception):
+    """Raised inside scrape, resolve or transfer work once its CancelToken is cancelled"""
+
+
+class CancelToken:
+    """
+    Cooperative cancellation flag shared between the API and worker threads.
+    Workers poll `cancelled` / `raise_if_cancelled()` between steps and register
+    callbacks (quit a driver, close a response) that tear down blocking work
+    immediately. A token created with a parent is cancelled along with it.
+    """
+
+    def __init__(self, parent=None):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        if parent is not None:
+            parent.on_cancel(self.cancel)
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                print(f"⚠️ Cancel callback failed: {e}")
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise DownloadCancelled("Download cancelled")
+
+    def wait(self, timeout):
+        """Sleep up to `timeout` seconds, returning True early if cancelled"""
+        return self._event.wait(timeout)
+
+    def on_cancel(self, fn):
+        """Run `fn` on cancellation (immediately if already cancelled)"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return
+        fn()
+
+    def remove(self, fn):
+        with self._lock:
+            if fn in self._callbacks:
+                self._callbacks.remove(fn)
+
+    @contextmanager
+    def callback(self, fn):
+        """Register `fn` for the duration of a `with` block"""
+        self.on_cancel(fn)
+        try:
+            yield
+        finally:
+            self.remove(fn)
+
+
+@contextmanager
+def cancel_callback(token, fn):
+    """`token.callback(fn)` that tolerates token being None"""
+    if token is None:
+        yield
+    else:
+        with token.callback(fn):
+            yield
+
+
+def check_cancelled(token):
+    """Raise DownloadCancelled if `token` (which may be None) has been cancelled"""
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def cancellable_sleep(token, seconds):
+    """time.sleep that wakes up and raises DownloadCancelled as soon as `token` is cancelled"""
+    if token is None:
+        time.sleep(seconds)
+    elif token.wait(seconds):
+        raise DownloadCancelled("Download cancelled")
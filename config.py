@@ -1,4 +1,6 @@
-BASE_ORIGIN = "https://animepahe.ru"
+import os
+
+BASE_ORIGIN = os.environ.get("ANIMEPAHE_ORIGIN", "https://animepahe.ru")
 API_BASE = f"{BASE_ORIGIN}/api"
 
 # Network-level adblock URL patterns toggled via Chrome DevTools Protocol
@@ -18,10 +20,138 @@ AD_BLOCK_PATTERNS = [
     "*://loveplumbertailor.com/*",
 ]
 
+# Requests blocked per page type, applied over CDP by browser.apply_interception.
+# A profile blocks whole resource types (matched by the URL patterns below) and
+# extra URL patterns; documents and scripts are always allowed because every
+# extraction step needs the DOM and the page's own scripts.
+RESOURCE_TYPE_PATTERNS = {
+    "Image": ["*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*"],
+    "Font": ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+    "Stylesheet": ["*.css*"],
+    "Media": ["*.webm*", "*.m3u8*", "*.vtt*"],
+}
+THIRD_PARTY_PATTERNS = [
+    "*://*.googletagmanager.com/*",
+    "*://*.cloudflareinsights.com/*",
+    "*://*.disqus.com/*",
+    "*://*.disquscdn.com/*",
+]
+INTERCEPTION_PROFILES = {
+    # Only the #pickDownload markup matters; the embedded kwik player is skipped too
+    "play": {
+        "types": ["Image", "Font", "Stylesheet", "Media"],
+        "urls": AD_BLOCK_PATTERNS + THIRD_PARTY_PATTERNS + ["*://kwik.*/e/*"],
+    },
+    # pahe.win Continue page and the kwik page it leads to; layout is kept for the clicks
+    "kwik": {
+        "types": ["Image", "Font", "Media"],
+        "urls": AD_BLOCK_PATTERNS + THIRD_PARTY_PATTERNS,
+    },
+    # DDoS-Guard sets its clearance cookie through image requests, so images stay allowed
+    "ddos": {
+        "types": ["Font", "Stylesheet", "Media"],
+        "urls": AD_BLOCK_PATTERNS + THIRD_PARTY_PATTERNS,
+    },
+}
+
 # Browser configuration
 BROWSER_MAX_RETRIES = 3
-BROWSER_CREATION_DELAY = 0.5
-BROWSER_CLEANUP_DELAY = 0.5
+BROWSER_READY_TIMEOUT = 10  # Wait for a new browser to answer scripts
+BROWSER_CLEANUP_TIMEOUT = 5  # Wait for Chrome to release its user data dir
+BROWSER_WAIT_POLL = 0.1  # Poll interval for condition-based waits
+CLICK_SETTLE_TIMEOUT = 0.5  # How long a click may take to open a popup or navigate
 BROWSER_RETRY_DELAY = 2
 
+# Warm browser pool shared by scraper, resolver and session manager
+BROWSER_POOL_SIZE = 2
+BROWSER_POOL_MAX_USES = 20  # Retire a driver after this many checkouts
+BROWSER_POOL_CHECKOUT_TIMEOUT = 120
+
+# Segmented (multi-connection) downloads
+TRANSFER_SEGMENTS = 4  # Parallel range requests per file; 1 disables segmenting
+TRANSFER_MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+TRANSFER_SEGMENT_RETRIES = 5
+TRANSFER_SEGMENT_RESTARTS = 2  # Fresh rounds after a segment gives up or the file changes
+TRANSFER_STATE_SAVE_BUFFERS = 8  # Save segment offsets after this many buffers per segment
+
+# Batch pipeline: workers per stage and bounded queue length between stages
+PIPELINE_SCRAPE_WORKERS = 1
+PIPELINE_RESOLVE_WORKERS = 1
+PIPELINE_TRANSFER_WORKERS = 2
+PIPELINE_QUEUE_SIZE = 2
+PIPELINE_SCRAPE_RETRIES = 3
+
+# Local state (caches, cookie store, task store) lives under DATA_DIR
+DATA_DIR = os.environ.get("ANIME_DL_DATA_DIR", ".anime_dl")
+
+# Scraped episode download links
+LINK_CACHE_PATH = os.path.join(DATA_DIR, "links.sqlite3")
+LINK_CACHE_TTL = 6 * 60 * 60  # Seconds before a cached episode is scraped again
+LINK_CACHE_MAX_ENTRIES = 5000
+
+# Saved DDoS-Guard clearance, reused across restarts after a cheap probe
+COOKIE_STORE_PATH = os.path.join(DATA_DIR, "clearance.json")
+CLEARANCE_PROBE_URL = f"{API_BASE}?m=airing&page=1"
+
+# Pacing of every request to animepahe (API, play pages, clearance probes), shared across all threads
+API_REQUESTS_PER_SECOND = 4
+EPISODE_PAGE_WORKERS = 4
+EPISODE_PAGE_RETRIES = 3
+
+# Resolve kwik links over plain HTTP before falling back to Selenium
+RESOLVER_HTTP_ENABLED = True
+# Longest wait for the intermediate page's countdown to arm the Continue link
+RESOLVER_COUNTDOWN_TIMEOUT = 15
+
+# Parse play pages over HTTP before falling back to Selenium
+SCRAPER_HTTP_ENABLED = True
+
+# POST /qualities/batch: play pages fetched over HTTP at once, and episodes per request
+QUALITIES_BATCH_HTTP_WORKERS = 4
+QUALITIES_BATCH_MAX_EPISODES = 200
+# Play pages loaded at once as tabs of one browser, and how long a tab may take
+SCRAPER_TABS = 4
+SCRAPER_TAB_TIMEOUT = 30
+
+# Multi-series batches (POST /download/batch, batch.py --jobs): episode lists
+# fetched at once, and jobs accepted per request
+BATCH_SERIES_WORKERS = 4
+BATCH_MAX_JOBS = 100
+
+# API server thread pools for blocking work
+BROWSER_EXECUTOR_WORKERS = BROWSER_POOL_SIZE
+HTTP_EXECUTOR_WORKERS = 8
+TRANSFER_EXECUTOR_WORKERS = 4  # Download tasks running at once
+
+# Process-wide transfer limits (changeable at runtime via PUT /transfers/limits)
+TRANSFER_MAX_CONNECTIONS = 8
+TRANSFER_MAX_PER_HOST = 4
+TRANSFER_BANDWIDTH_LIMIT = 0  # Bytes per second across all transfers, 0 for unlimited
+
+# Durable download task store; resolved links older than the TTL are resolved again on resume
+TASK_STORE_PATH = os.path.join(DATA_DIR, "tasks.sqlite3")
+TASK_RESOLVED_TTL = 30 * 60
+
+# Live progress events: minimum seconds between byte updates and EWMA smoothing factor
+PROGRESS_MIN_INTERVAL = 0.5
+PROGRESS_EWMA_ALPHA = 0.3
+
+# Transfer write path: bytes read per call into a reused buffer, disk preallocation
+# for ranged downloads, and dropping written pages from the page cache
+TRANSFER_BUFFER_SIZE = 4 * 1024 * 1024
+TRANSFER_PREALLOCATE = True
+TRANSFER_DROP_CACHE = False
+
+# Hash computed while streaming single-stream downloads (None to skip). A server
+# Digest/Content-MD5 header overrides it and the result is then verified
+TRANSFER_HASH_ALGORITHM = "sha256"
+
+# Search: upstream results are cached per normalized query, and every title seen
+# is kept in a local index for fuzzy type-ahead (GET /search/local)
+SEARCH_CACHE_TTL = 10 * 60
+SEARCH_CACHE_MAX_ENTRIES = 512
+TITLE_INDEX_PATH = os.path.join(DATA_DIR, "titles.json")
+TITLE_INDEX_MIN_SCORE = 0.3
 
+# Write every metric as JSON to this path when the CLI exits (unset to skip)
+METRICS_DUMP_PATH = os.environ.get("ANIME_DL_METRICS_JSON")
@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+from config import COOKIE_STORE_PATH
+
+
+def _is_clearance_cookie(cookie):
+    return cookie.get("name", "").startswith("__ddg")
+
+
+def cookie_key(cookie):
+    """Identity of a Selenium-style cookie dict: name, domain and path"""
+    return cookie["name"], (cookie.get("domain") or "").lstrip("."), cookie.get("path") or "/"
+
+
+def load_clearance(path=None):
+    """
+    Load saved DDoS-Guard clearance. Returns {"user_agent", "cookies"} with expired
+    cookies dropped, or None when nothing usable is stored.
+    """
+    path = path or COOKIE_STORE_PATH
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    now = time.time()
+    cookies = [c for c in data.get("cookies", []) if not c.get("expiry") or c["expiry"] > now]
+    if not any(_is_clearance_cookie(c) for c in cookies):
+        return None
+    return {"user_agent": data.get("user_agent"), "cookies": cookies}
+
+
+def save_clearance(cookies, user_agent, path=None):
+    """Persist Selenium-style cookie dicts and the User-Agent they were issued to"""
+    path = path or COOKIE_STORE_PATH
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data = {
+        "user_agent": user_agent,
+        "saved_at": time.time(),
+        "cookies": [
+            {k: c[k] for k in ("name", "value", "domain", "path", "expiry") if c.get(k) is not None}
+            for c in cookies
+        ],
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def clear_clearance(path=None):
+    try:
+        os.remove(path or COOKIE_STORE_PATH)
+    except OSError:
+        pass
+
+
+class ClearanceJar:
+    """
+    Process-wide DDoS-Guard clearance shared by SessionManager and every pooled
+    driver. Seeded from the cookie store; whichever source is issued fresher
+    cookies writes them back here and the store is rewritten, so one clearance
+    serves the whole process. `version` changes on every update.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or COOKIE_STORE_PATH
+        self._lock = threading.Lock()
+        self._cookies = {}  # cookie_key -> cookie dict
+        self.user_agent = None
+        self.version = 0
+        self.reload()
+
+    def reload(self):
+        """Replace the cookies in memory with the store (another process may have refreshed it)"""
+        stored = load_clearance(self.path) or {}
+        with self._lock:
+            self._cookies = {cookie_key(c): c for c in stored.get("cookies", [])}
+            self.user_agent = stored.get("user_agent")
+            self.version += 1
+        return bool(stored)
+
+    def snapshot(self):
+        """{"user_agent", "cookies", "version"}, or None when there is no clearance cookie"""
+        with self._lock:
+            cookies = [dict(c) for c in self._cookies.values()]
+            if not any(_is_clearance_cookie(c) for c in cookies):
+                return None
+            return {"user_agent": self.user_agent, "cookies": cookies, "version": self.version}
+
+    def update(self, cookies, user_agent=None, since=None, clearance_only=False):
+        """
+        Merge cookies seen by a browser or HTTP session. With `since` (cookie_key ->
+        value the source started from) only cookies the source was issued since
+        are taken, so a source holding older clearance never overwrites newer.
+        Returns True and rewrites the store when anything changed.
+        """
+        with self._lock:
+            changed = False
+            for cookie in cookies:
+                if clearance_only and not _is_clearance_cookie(cookie):
+                    continue
+                key = cookie_key(cookie)
+                if since is not None and since.get(key) == cookie["value"]:
+                    continue
+                if self._cookies.get(key, {}).get("value") != cookie["value"]:
+                    self._cookies[key] = dict(cookie)
+                    changed = True
+            if user_agent and user_agent != self.user_agent:
+                self.user_agent = user_agent
+                changed = True
+            if changed:
+                self.version += 1
+                save_clearance(list(self._cookies.values()), self.user_agent, self.path)
+            return changed
+
+    def clear(self):
+        with self._lock:
+            self._cookies = {}
+            self.version += 1
+        clear_clearance(self.path)
+
+
+_jar = None
+_jar_lock = threading.Lock()
+
+
+def get_clearance_jar():
+    """Get or create the process-wide clearance jar"""
+    global _jar
+    with _jar_lock:
+        if _jar is None:
+            _jar = ClearanceJar()
+        return _jar
@@ -0,0 +1,15 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from config import BROWSER_EXECUTOR_WORKERS, HTTP_EXECUTOR_WORKERS, TRANSFER_EXECUTOR_WORKERS
+
+# Blocking work is split by kind so a slow browser scrape cannot starve API calls or transfers
+browser_executor = ThreadPoolExecutor(max_workers=BROWSER_EXECUTOR_WORKERS, thread_name_prefix="browser")
+http_executor = ThreadPoolExecutor(max_workers=HTTP_EXECUTOR_WORKERS, thread_name_prefix="http")
+transfer_executor = ThreadPoolExecutor(max_workers=TRANSFER_EXECUTOR_WORKERS, thread_name_prefix="transfer")
+
+
+async def run_in(executor, fn, *args, **kwargs):
+    """Run a blocking call on `executor` and await its result without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
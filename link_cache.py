@@ -0,0 +1,100 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from config import LINK_CACHE_PATH, LINK_CACHE_TTL, LINK_CACHE_MAX_ENTRIES
+
+
+class LinkCache:
+    """Durable cache of scraped {quality_lang: url} dicts keyed by (anime_session, episode_session)"""
+
+    def __init__(self, path=None, ttl=None, max_entries=None):
+        self.path = path or LINK_CACHE_PATH
+        self.ttl = ttl if ttl is not None else LINK_CACHE_TTL
+        self.max_entries = max_entries if max_entries is not None else LINK_CACHE_MAX_ENTRIES
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS links ("
+            " anime_session TEXT NOT NULL,"
+            " episode_session TEXT NOT NULL,"
+            " links TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (anime_session, episode_session))"
+        )
+        self._conn.commit()
+
+    def get(self, anime_session, episode_session):
+        """Return the cached links, or None when missing or older than the TTL"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT links, created_at FROM links WHERE anime_session = ? AND episode_session = ?",
+                (anime_session, episode_session),
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._conn.execute(
+                    "DELETE FROM links WHERE anime_session = ? AND episode_session = ?",
+                    (anime_session, episode_session),
+                )
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE links SET accessed_at = ? WHERE anime_session = ? AND episode_session = ?",
+                (now, anime_session, episode_session),
+            )
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, anime_session, episode_session, links):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?, ?)",
+                (anime_session, episode_session, json.dumps(links), now, now),
+            )
+            # Evict least recently used entries beyond the size bound
+            self._conn.execute(
+                "DELETE FROM links WHERE rowid IN ("
+                " SELECT rowid FROM links ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def invalidate(self, anime_session, episode_session=None):
+        """Drop one episode, or every episode of a series when episode_session is None"""
+        with self._lock:
+            if episode_session is None:
+                self._conn.execute("DELETE FROM links WHERE anime_session = ?", (anime_session,))
+            else:
+                self._conn.execute(
+                    "DELETE FROM links WHERE anime_session = ? AND episode_session = ?",
+                    (anime_session, episode_session),
+                )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM links")
+            self._conn.commit()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_link_cache():
+    """Get or create the process-wide link cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LinkCache()
+        return _cache
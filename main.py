@@ -1,17 +1,29 @@
 from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import asyncio
+import json
 import os
+import threading
+import time
 import uuid
 from datetime import datetime
 
 from session_mgr import SessionManager
-from api_client import search_anime, get_all_episodes
-from scraper import scrape_download_links
-from resolver import resolve_download_info
-from transfer import advanced_download_with_progress
+from api_client import search_anime, get_all_episodes, EpisodeListIncomplete
+from scraper import scrape_download_links, scrape_download_links_batch
+from pipeline import run_episode_pipeline
+from batch_queue import episode_filename, plan_batch, work_key
+from executors import browser_executor, http_executor, transfer_executor, run_in
+from scheduler import get_transfer_scheduler
+from task_store import get_task_store
+from cancel import CancelToken, DownloadCancelled
+from progress import TaskProgress
+from search_index import get_search_cache, get_title_index
+from singleflight import SingleFlight
+from metrics import REGISTRY
+from config import TASK_RESOLVED_TTL, QUALITIES_BATCH_MAX_EPISODES, BATCH_MAX_JOBS
 
 app = FastAPI(
     title="Anime Batch Downloader API",
@@ -21,16 +33,71 @@ app = FastAPI(
 
 # Global session manager - initialized lazily to avoid startup issues
 sm = None
+_sm_lock = threading.Lock()
 
 def get_session_manager():
-    """Get or create session manager"""
+    """Get or create session manager (blocking; call from an executor thread)"""
     global sm
-    if sm is None:
-        sm = SessionManager()
+    with _sm_lock:
+        if sm is None:
+            sm = SessionManager()
     return sm
 
-# In-memory storage for download tasks (in production, use Redis or database)
+# Live view of download tasks; every change is written through to the durable task store
 download_tasks = {}
+task_store = get_task_store()
+
+# Cancellation tokens for running tasks and, per task, for each episode session
+task_tokens: Dict[str, CancelToken] = {}
+episode_tokens: Dict[str, Dict[str, CancelToken]] = {}
+
+# Byte-level progress of running tasks, streamed by /download/{task_id}/events
+task_progress: Dict[str, TaskProgress] = {}
+
+# Concurrent requests for the same episodes/qualities share one upstream fetch
+flights = SingleFlight()
+
+def qualities_from_links(links):
+    """Group {"720_eng": url} keys into {"720": ["eng", ...]}"""
+    qualities = {}
+    for key in links.keys():
+        if "_" in key:
+            quality, language = key.split("_", 1)
+            if quality not in qualities:
+                qualities[quality] = []
+            if language not in qualities[quality]:
+                qualities[quality].append(language)
+    return qualities
+
+def save_task(task):
+    """Persist the current state of a DownloadTask"""
+    task_store.update_task(task.task_id, **task.model_dump(exclude={"task_id"}))
+
+def create_task(anime_session, episodes, quality, language, download_directory, batch_id=None):
+    """
+    Register a pending DownloadTask for `episodes` in memory and in the durable
+    store. Tasks of one batch share a `batch_id` so a restart resumes them together.
+    """
+    task = DownloadTask(
+        task_id=str(uuid.uuid4()),
+        status="pending",
+        progress=0.0,
+        total_episodes=len(episodes),
+        created_at=datetime.now()
+    )
+    download_tasks[task.task_id] = task
+    task_store.create_task(
+        {
+            **task.model_dump(),
+            "anime_session": anime_session,
+            "quality": quality,
+            "language": language,
+            "download_directory": download_directory,
+            "batch_id": batch_id,
+        },
+        episodes,
+    )
+    return task
 
 class SearchRequest(BaseModel):
     query: str
@@ -58,6 +125,10 @@ class QualityRequest(BaseModel):
     anime_session: str
     episode_session: str
 
+class QualityBatchRequest(BaseModel):
+    anime_session: str
+    episode_sessions: List[str]
+
 class DownloadRequest(BaseModel):
     anime_session: str
     episodes: List[int]  # List of episode numbers
@@ -65,11 +136,26 @@ class DownloadRequest(BaseModel):
     language: str = "eng"
     download_directory: str = "./"
 
+class BatchJob(BaseModel):
+    anime_session: str
+    episodes: Optional[List[int]] = None  # None for every episode
+    quality: str = "720"
+    language: str = "eng"
+    download_directory: str = "./"
+
+class BatchDownloadRequest(BaseModel):
+    jobs: List[BatchJob]
+
+class TransferLimits(BaseModel):
+    max_connections: Optional[int] = None
+    max_per_host: Optional[int] = None
+    bandwidth: Optional[int] = None  # Bytes per second, 0 for unlimited
+
 class DownloadTask(BaseModel):
     task_id: str
     status: str  # "pending", "running", "completed", "failed"
     progress: float
-    current_episode: Optional[int] = None
+    current_episode: Optional[float] = None  # Half episodes such as 12.5 exist
     total_episodes: int
     created_at: datetime
     completed_at: Optional[datetime] = None
@@ -83,9 +169,12 @@ async def root():
 async def search_anime_endpoint(request: SearchRequest):
     """Search for anime by name"""
     try:
-        # Get session manager in a thread-safe way
-        session_manager = get_session_manager()
-        results = search_anime(session_manager, request.query)
+        # Repeat queries are answered from the cache without waking the session manager
+        results = get_search_cache().get(request.query)
+        if results is None:
+            results = await run_in(
+                http_executor, lambda: search_anime(get_session_manager(), request.query, use_cache=False)
+            )
         if not results:
             raise HTTPException(status_code=404, detail="No anime found for your search query. Try different keywords.")
         
@@ -115,16 +204,27 @@ async def search_anime_endpoint(request: SearchRequest):
         else:
             raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
+@app.get("/search/local", response_model=List[SearchResult])
+async def search_local_endpoint(q: str, limit: int = 10):
+    """Fuzzy type-ahead over titles seen in earlier searches; never calls the API"""
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    return [SearchResult(**result) for result in get_title_index().search(q, limit)]
+
 @app.post("/episodes", response_model=List[Episode])
 async def get_episodes_endpoint(request: EpisodesRequest):
     """Get all episodes for a specific anime"""
     try:
-        session_manager = get_session_manager()
-        episodes = get_all_episodes(session_manager, request.anime_session)
+        episodes = await flights.run(
+            ("episodes", request.anime_session),
+            lambda: run_in(http_executor, lambda: get_all_episodes(get_session_manager(), request.anime_session)),
+        )
         if not episodes:
             raise HTTPException(status_code=404, detail="No episodes found")
         
         return [Episode(**ep) for ep in episodes]
+    except EpisodeListIncomplete as e:
+        raise HTTPException(status_code=502, detail=str(e))
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
@@ -137,23 +237,20 @@ async def get_qualities_endpoint(request: QualityRequest):
     try:
         print(f"🔍 Fetching qualities for anime: {request.anime_session}, episode: {request.episode_session}")
         
-        links = scrape_download_links(request.anime_session, request.episode_session)
+        links = await flights.run(
+            ("qualities", request.anime_session, request.episode_session),
+            lambda: run_in(
+                browser_executor,
+                lambda: scrape_download_links(request.anime_session, request.episode_session, sm=get_session_manager())
+            ),
+        )
         if not links:
             raise HTTPException(
                 status_code=404, 
                 detail="No download links found for this episode. The episode may not be available or the site structure may have changed."
             )
         
-        # Parse qualities and languages
-        qualities = {}
-        for key in links.keys():
-            if "_" in key:
-                quality, language = key.split("_", 1)
-                if quality not in qualities:
-                    qualities[quality] = []
-                if language not in qualities[quality]:
-                    qualities[quality].append(language)
-        
+        qualities = qualities_from_links(links)
         print(f"✅ Found {len(links)} download links with {len(qualities)} quality options")
         return {
             "available_qualities": qualities,
@@ -192,30 +289,77 @@ async def get_qualities_endpoint(request: QualityRequest):
                 detail=f"Failed to get episode qualities: {str(e)}"
             )
 
+@app.post("/qualities/batch")
+async def get_qualities_batch_endpoint(request: QualityBatchRequest):
+    """
+    Qualities for many episodes of one series, streamed as NDJSON (one line per
+    episode, in completion order). Reuses the HTTP path and one pooled browser
+    for all of them and fills the link cache for later downloads.
+    """
+    if not request.episode_sessions:
+        raise HTTPException(status_code=400, detail="episode_sessions must not be empty")
+    if len(request.episode_sessions) > QUALITIES_BATCH_MAX_EPISODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {QUALITIES_BATCH_MAX_EPISODES} episodes per request"
+        )
+
+    loop = asyncio.get_running_loop()
+    results: asyncio.Queue = asyncio.Queue()
+    cancel_token = CancelToken()
+    done = object()
+
+    def scrape_all():
+        try:
+            for episode_session, links, error in scrape_download_links_batch(
+                request.anime_session, request.episode_sessions,
+                sm=get_session_manager(), cancel_token=cancel_token
+            ):
+                line = {"episode_session": episode_session}
+                if error:
+                    line["error"] = error
+                else:
+                    line["available_qualities"] = qualities_from_links(links)
+                    line["raw_links"] = links
+                loop.call_soon_threadsafe(results.put_nowait, line)
+        except DownloadCancelled:
+            pass
+        except Exception as e:
+            print(f"❌ Batch qualities error: {e}")
+            loop.call_soon_threadsafe(results.put_nowait, {"error": str(e)})
+        finally:
+            loop.call_soon_threadsafe(results.put_nowait, done)
+
+    async def lines():
+        worker = asyncio.ensure_future(run_in(browser_executor, scrape_all))
+        try:
+            while True:
+                line = await results.get()
+                if line is done:
+                    break
+                yield json.dumps(line) + "\n"
+        finally:
+            # Client went away or everything was sent; stop any remaining scraping
+            cancel_token.cancel()
+            await asyncio.shield(worker)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @app.post("/download")
 async def start_download_endpoint(request: DownloadRequest, background_tasks: BackgroundTasks):
     """Start downloading episodes in the background"""
     try:
-        # Generate unique task ID
-        task_id = str(uuid.uuid4())
-        
         # Get episodes for the anime
-        session_manager = get_session_manager()
-        all_episodes = get_all_episodes(session_manager, request.anime_session)
+        all_episodes = await run_in(http_executor, lambda: get_all_episodes(get_session_manager(), request.anime_session))
         selected_episodes = [ep for ep in all_episodes if ep["episode"] in request.episodes]
         
         if not selected_episodes:
             raise HTTPException(status_code=404, detail="No matching episodes found")
         
-        # Create download task
-        task = DownloadTask(
-            task_id=task_id,
-            status="pending",
-            progress=0.0,
-            total_episodes=len(selected_episodes),
-            created_at=datetime.now()
+        task = create_task(
+            request.anime_session, selected_episodes, request.quality, request.language, request.download_directory
         )
-        download_tasks[task_id] = task
+        task_id = task.task_id
         
         # Start download in background
         background_tasks.add_task(
@@ -230,12 +374,63 @@ async def start_download_endpoint(request: DownloadRequest, background_tasks: Ba
         
         return {"task_id": task_id, "message": f"Download started for {len(selected_episodes)} episodes"}
     
+    except EpisodeListIncomplete as e:
+        # Requested episodes may sit on the missing pages; don't report them as nonexistent
+        raise HTTPException(status_code=502, detail=str(e))
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
         print(f"❌ Download endpoint error: {error_details}")
         raise HTTPException(status_code=500, detail=f"Failed to start download: {str(e)}")
 
+@app.post("/download/batch")
+async def start_batch_download_endpoint(request: BatchDownloadRequest, background_tasks: BackgroundTasks):
+    """
+    Start many (series, episodes, quality, language) jobs at once. Every job gets
+    its own task, but all of them feed one shared pipeline in which identical
+    episode requests are downloaded once.
+    """
+    if not request.jobs:
+        raise HTTPException(status_code=400, detail="jobs must not be empty")
+    if len(request.jobs) > BATCH_MAX_JOBS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_JOBS} jobs per request")
+    try:
+        jobs = [job.model_dump() for job in request.jobs]
+        work, plan = await run_in(http_executor, lambda: plan_batch(get_session_manager(), jobs))
+
+        batch_id = str(uuid.uuid4())
+        tasks, owners, summary = [], {}, []
+        for entry in plan:
+            job = entry["job"]
+            if entry["error"]:
+                summary.append({"anime_session": job["anime_session"], "task_id": None, "error": entry["error"]})
+                continue
+            task = create_task(
+                job["anime_session"], [work[key] for key in entry["keys"]],
+                job["quality"], job["language"], job["download_directory"], batch_id=batch_id
+            )
+            tasks.append((task, entry["keys"]))
+            for key in entry["keys"]:
+                owners.setdefault(key, []).append(task.task_id)
+            summary.append({"anime_session": job["anime_session"], "task_id": task.task_id, "episodes": len(entry["keys"])})
+
+        if tasks:
+            background_tasks.add_task(download_batch_background, batch_id, tasks, work, owners)
+        requested = sum(len(keys) for _, keys in tasks)
+        return {
+            "batch_id": batch_id,
+            "jobs": summary,
+            "episodes_requested": requested,
+            "episodes_unique": len(work),
+            "message": f"Batch started: {len(work)} unique episodes for {len(tasks)} jobs",
+        }
+
+    except Exception as e:
+        import traceback
+        error_details = traceback.format_exc()
+        print(f"❌ Batch download endpoint error: {error_details}")
+        raise HTTPException(status_code=500, detail=f"Failed to start batch download: {str(e)}")
+
 @app.get("/download/{task_id}")
 async def get_download_status(task_id: str):
     """Get download task status and progress"""
@@ -244,6 +439,44 @@ async def get_download_status(task_id: str):
     
     return download_tasks[task_id]
 
+@app.get("/download/{task_id}/events")
+async def stream_download_events(task_id: str):
+    """Server-sent events with per-episode stage changes, bytes, throughput and ETA"""
+    if task_id not in download_tasks:
+        raise HTTPException(status_code=404, detail="Download task not found")
+
+    def sse(event_type, data):
+        return f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    tracker = task_progress.get(task_id)
+
+    async def events():
+        if tracker is None or tracker.finished:
+            # Nothing is running; report the stored status once
+            task = download_tasks[task_id]
+            yield sse("end", {"type": "end", "task_id": task_id, "status": task.status, "progress": task.progress})
+            return
+        queue = tracker.subscribe(asyncio.get_running_loop())
+        try:
+            yield sse("snapshot", tracker.snapshot())
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse(event["type"], event)
+                if event["type"] == "end":
+                    break
+        finally:
+            tracker.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/downloads")
 async def list_download_tasks():
     """List all download tasks"""
@@ -256,82 +489,355 @@ async def cancel_download_task(task_id: str):
         raise HTTPException(status_code=404, detail="Download task not found")
     
     task = download_tasks[task_id]
-    if task.status in ["completed", "failed"]:
+    if task.status in ["completed", "failed", "cancelled"]:
         raise HTTPException(status_code=400, detail=f"Cannot cancel {task.status} task")
     
     task.status = "cancelled"
+    task.completed_at = datetime.now()
+    save_task(task)
+    # Quits drivers and closes streams in flight; queued episodes are skipped
+    if task_id in task_tokens:
+        task_tokens[task_id].cancel()
     return {"message": "Download task cancelled"}
 
+@app.delete("/download/{task_id}/episodes/{episode}")
+async def cancel_download_episode(task_id: str, episode: int):
+    """Cancel a single episode of a running task"""
+    if task_id not in download_tasks:
+        raise HTTPException(status_code=404, detail="Download task not found")
+    
+    matches = [ep for ep in task_store.episodes(task_id) if ep["episode"] == episode]
+    if not matches:
+        raise HTTPException(status_code=404, detail="Episode not found in this task")
+    ep = matches[0]
+    if ep["state"] in ["complete", "failed", "cancelled"]:
+        raise HTTPException(status_code=400, detail=f"Cannot cancel {ep['state']} episode")
+    
+    task_store.update_episode(task_id, ep["episode_session"], state="cancelled")
+    token = episode_tokens.get(task_id, {}).get(ep["episode_session"])
+    if token:
+        token.cancel()
+    return {"message": f"Episode {episode} cancelled"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics: stage latencies, retries, throughput and pool occupancy"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/transfers")
+async def get_transfer_stats():
+    """Active transfers, queued connections and current limits"""
+    return get_transfer_scheduler().stats()
+
+@app.put("/transfers/limits")
+async def set_transfer_limits(limits: TransferLimits):
+    """Change global connection, per-host and bandwidth limits at runtime"""
+    for name, value in limits.model_dump().items():
+        if value is not None and value < (0 if name == "bandwidth" else 1):
+            raise HTTPException(status_code=400, detail=f"Invalid value for {name}: {value}")
+    scheduler = get_transfer_scheduler()
+    scheduler.set_limits(**limits.model_dump())
+    return scheduler.stats()
+
+class TaskReporter:
+    """
+    Writes one task's pipeline callbacks (on_stage, on_done, progress_for)
+    through to its DownloadTask, the durable store and its live progress stream.
+    `tokens` are the task's episode tokens, keyed like the pipeline's.
+    """
+
+    def __init__(self, task, tokens, done_before=0):
+        self.task = task
+        self.tokens = tokens
+        self.done_before = done_before
+        self.completed = 0
+        self.tracker = task_progress[task.task_id] = TaskProgress(
+            task.task_id, task.total_episodes, completed_before=done_before
+        )
+
+    def on_stage(self, episode, stage, item):
+        self.tracker.stage(episode["episode"], stage)
+        if stage == "scraped":
+            task_store.update_episode(self.task.task_id, episode["session"], state="scraped", raw_url=item["raw_url"])
+        elif stage == "resolved":
+            task_store.update_episode(
+                self.task.task_id, episode["session"],
+                state="resolved", download_info=item["download_info"], resolved_at=time.time()
+            )
+
+    def on_done(self, episode, success):
+        task = self.task
+        self.completed += 1
+        task.current_episode = episode["episode"]
+        task.progress = ((self.done_before + self.completed) / task.total_episodes) * 100
+        token = self.tokens.get(episode["session"])
+        # A batch episode can finish for other tasks after this one cancelled it
+        if token and token.cancelled:
+            state = "cancelled"
+        elif success:
+            state = "complete"
+        else:
+            state = "failed"
+        task_store.update_episode(task.task_id, episode["session"], state=state)
+        self.tracker.stage(episode["episode"], state)
+        save_task(task)
+        if not success:
+            print(f"❌ Failed to download episode {episode['episode']}")
+
+    def progress_for(self, episode):
+        task = self.task
+        def on_bytes(done, total):
+            event = self.tracker.bytes(episode["episode"], done, total)
+            if event is None:
+                return
+            # Only coalesced updates reach the store, so writes stay at the event rate
+            task.progress = event["progress"]
+            task_store.update_episode(task.task_id, episode["session"], bytes_done=done)
+            save_task(task)
+        return on_bytes
+
 async def download_episodes_background(
     task_id: str,
     anime_session: str,
     episodes: List[Dict[str, Any]],
     quality: str,
     language: str,
-    download_directory: str
+    download_directory: str,
+    resume: Optional[Dict[str, Dict[str, Any]]] = None,
+    done_before: int = 0
 ):
     """Background task to download episodes"""
     task = download_tasks[task_id]
+    if task.status == "cancelled":
+        return
     task.status = "running"
+    save_task(task)
+    cancel_token = task_tokens[task_id] = CancelToken()
+    tokens = episode_tokens[task_id] = {}
+    reporter = TaskReporter(task, tokens, done_before)
     
     try:
-        for i, episode in enumerate(episodes):
-            task.current_episode = episode["episode"]
-            task.progress = (i / len(episodes)) * 100
-            
-            print(f"🎬 Processing Episode {episode['episode']}")
-            
-            # Get download links with retry for browser conflicts
-            links = {}
-            max_attempts = 3
-            for attempt in range(max_attempts):
-                try:
-                    links = scrape_download_links(anime_session, episode["session"])
-                    if links:
-                        break
-                    else:
-                        print(f"⚠️ No links found on attempt {attempt + 1}/{max_attempts}")
-                except Exception as e:
-                    print(f"⚠️ Scraping failed on attempt {attempt + 1}/{max_attempts}: {e}")
-                    if "user data directory" in str(e).lower() or "session not created" in str(e).lower():
-                        print("🔧 Browser conflict detected, retrying with delay...")
-                        import time
-                        time.sleep(2 ** attempt)  # Exponential backoff
-                    if attempt == max_attempts - 1:
-                        print(f"❌ Failed to get download links for episode {episode['episode']} after {max_attempts} attempts")
-                        continue
-            
-            raw_url = links.get(f"{quality}_{language}")
-            
-            if not raw_url:
-                print(f"⚠️ {quality}p {language.upper()} not available for episode {episode['episode']}")
-                continue
-            
-            # Resolve download info
-            download_info = resolve_download_info(raw_url)
-            if not download_info:
-                print(f"⚠️ Could not resolve download info for episode {episode['episode']}")
-                continue
-            
-            # Set filename if not extracted
-            if not download_info.get('filename'):
-                download_info['filename'] = f"Episode_{episode['episode']}"
-            
-            # Download episode
-            success = advanced_download_with_progress(download_info, download_directory)
-            if not success:
-                print(f"❌ Failed to download episode {episode['episode']}")
+        # The pipeline blocks for the whole task, so it runs on the transfer executor
+        await run_in(
+            transfer_executor,
+            lambda: run_episode_pipeline(
+                anime_session,
+                episodes,
+                quality,
+                language,
+                download_directory,
+                filename_for=lambda ep: f"Episode_{ep['episode']}",
+                on_done=reporter.on_done,
+                sm=get_session_manager(),
+                on_stage=reporter.on_stage,
+                resume=resume,
+                cancel_token=cancel_token,
+                episode_tokens=tokens,
+                progress_for=reporter.progress_for,
+            )
+        )
+        
+        if cancel_token.cancelled:
+            print(f"🛑 Download task {task_id} cancelled")
+            return
         
         # Mark task as completed
         task.status = "completed"
         task.progress = 100.0
         task.completed_at = datetime.now()
+        save_task(task)
         print(f"✅ All episodes downloaded for task {task_id}")
         
     except Exception as e:
         task.status = "failed"
         task.error_message = str(e)
+        save_task(task)
         print(f"❌ Download task {task_id} failed: {e}")
+    finally:
+        reporter.tracker.finish(task.status)
+        task_progress.pop(task_id, None)
+        task_tokens.pop(task_id, None)
+        episode_tokens.pop(task_id, None)
+
+async def download_batch_background(
+    batch_id: str,
+    tasks: List[Any],
+    work: Dict[str, Dict[str, Any]],
+    owners: Dict[str, List[str]],
+    resume: Optional[Dict[str, Dict[str, Any]]] = None,
+    done_before: Optional[Dict[str, int]] = None
+):
+    """
+    Run the unique episodes of a batch through one pipeline. `tasks` holds
+    (DownloadTask, work keys) per job and `owners` maps each work key to the
+    tasks that asked for it; every owner sees the episode's progress and result.
+    Each task holds its own token per episode, so cancelling a task or one of
+    its episodes only stops the download once no other task still wants it.
+    A resumed batch passes its saved `resume` state (by work key) and each
+    task's `done_before` count (by task id).
+    """
+    batch_token = CancelToken()
+    shared_tokens = {key: CancelToken(parent=batch_token) for key in work}
+    wanted = {key: [] for key in work}  # Owners' episode tokens per work key
+    reporters = {}
+
+    def release(key):
+        if all(token.cancelled for token in wanted[key]):
+            shared_tokens[key].cancel()
+
+    for task, keys in tasks:
+        task_token = task_tokens[task.task_id] = CancelToken()
+        tokens = episode_tokens[task.task_id] = {}
+        for key in keys:
+            tokens[work[key]["session"]] = CancelToken(parent=task_token)
+            wanted[key].append(tokens[work[key]["session"]])
+        reporters[task.task_id] = TaskReporter(task, tokens, (done_before or {}).get(task.task_id, 0))
+    # Registered once every owner's token exists, so no release sees a partial list
+    for key, tokens in wanted.items():
+        for token in tokens:
+            token.on_cancel(lambda key=key: release(key))
+    for task, keys in tasks:
+        if task.status == "cancelled":
+            # Cancelled before the batch started
+            task_tokens[task.task_id].cancel()
+        else:
+            task.status = "running"
+            save_task(task)
+
+    def reporters_for(episode, live=False):
+        """The episode's owners, or only those that have not cancelled it when `live`"""
+        for owner in owners[episode["key"]]:
+            reporter = reporters[owner]
+            if not live or not reporter.tokens[episode["session"]].cancelled:
+                yield reporter
+
+    def on_stage(episode, stage, item):
+        for reporter in reporters_for(episode, live=True):
+            reporter.on_stage(episode, stage, item)
+
+    def on_done(episode, success):
+        for reporter in reporters_for(episode):
+            reporter.on_done(episode, success)
+
+    def progress_for(episode):
+        callbacks = {owner: reporters[owner].progress_for(episode) for owner in owners[episode["key"]]}
+        def on_bytes(done, total):
+            for reporter in reporters_for(episode, live=True):
+                callbacks[reporter.task.task_id](done, total)
+        return on_bytes
+
+    print(f"📦 Batch {batch_id}: {len(work)} unique episodes for {len(tasks)} tasks")
+    try:
+        await run_in(
+            transfer_executor,
+            lambda: run_episode_pipeline(
+                None, list(work.values()), None, None,
+                filename_for=episode_filename,
+                on_done=on_done,
+                sm=get_session_manager(),
+                on_stage=on_stage,
+                resume=resume,
+                cancel_token=batch_token,
+                episode_tokens=shared_tokens,
+                progress_for=progress_for,
+            )
+        )
+        for task, _ in tasks:
+            if task.status == "running":
+                task.status = "completed"
+                task.progress = 100.0
+                task.completed_at = datetime.now()
+                save_task(task)
+        print(f"✅ Batch {batch_id} finished")
+
+    except Exception as e:
+        for task, _ in tasks:
+            if task.status == "running":
+                task.status = "failed"
+                task.error_message = str(e)
+                save_task(task)
+        print(f"❌ Batch {batch_id} failed: {e}")
+    finally:
+        for task, _ in tasks:
+            reporters[task.task_id].tracker.finish(task.status)
+            task_progress.pop(task.task_id, None)
+            task_tokens.pop(task.task_id, None)
+            episode_tokens.pop(task.task_id, None)
+
+def unfinished_episodes(task_id):
+    """
+    A stored task's episodes still to download, the saved scrape/resolve state
+    of each (by episode session) and how many episodes are already settled
+    """
+    episodes, resume, done_before = [], {}, 0
+    for ep in task_store.episodes(task_id):
+        if ep["state"] in ("complete", "failed", "cancelled"):
+            done_before += 1
+            continue
+        episodes.append({"episode": ep["episode"], "session": ep["episode_session"]})
+        saved = {"raw_url": ep["raw_url"]}
+        # Resolved kwik links expire; only reuse recent ones
+        if ep["state"] == "resolved" and time.time() - (ep["resolved_at"] or 0) < TASK_RESOLVED_TTL:
+            saved["download_info"] = ep["download_info"]
+        resume[ep["episode_session"]] = saved
+    return episodes, resume, done_before
+
+def resume_batch(batch_id, rows):
+    """Rebuild a batch's shared, deduplicated queue from its stored tasks and continue it"""
+    tasks, work, owners, resume, done_before = [], {}, {}, {}, {}
+    for row in rows:
+        episodes, saved, done_before[row["task_id"]] = unfinished_episodes(row["task_id"])
+        keys = []
+        for episode in episodes:
+            key = work_key(row["anime_session"], episode["session"], row["quality"], row["language"],
+                           row["download_directory"])
+            work.setdefault(key, {
+                **episode,
+                "key": key,
+                "anime_session": row["anime_session"],
+                "quality": row["quality"],
+                "language": row["language"],
+                "download_directory": row["download_directory"],
+            })
+            resume.setdefault(key, saved[episode["session"]])
+            owners.setdefault(key, []).append(row["task_id"])
+            keys.append(key)
+        tasks.append((download_tasks[row["task_id"]], keys))
+    print(f"♻️ Resuming batch {batch_id}: {len(work)} unique episodes left for {len(tasks)} tasks")
+    asyncio.create_task(download_batch_background(batch_id, tasks, work, owners, resume=resume, done_before=done_before))
+
+@app.on_event("startup")
+async def resume_unfinished_tasks():
+    """Reload tasks from the durable store and continue the ones a restart interrupted"""
+    for row in task_store.list_tasks():
+        try:
+            download_tasks[row["task_id"]] = DownloadTask(**{name: row[name] for name in DownloadTask.model_fields})
+        except Exception as e:
+            # One unreadable row must not keep the API from starting
+            print(f"⚠️ Skipping stored task {row['task_id']}: {e}")
+
+    batches = {}
+    for row in task_store.unfinished_tasks():
+        if row["task_id"] not in download_tasks:
+            continue
+        if row["batch_id"]:
+            # Batch tasks share deduplicated episodes, so they resume together
+            batches.setdefault(row["batch_id"], []).append(row)
+            continue
+        episodes, resume, done_before = unfinished_episodes(row["task_id"])
+        print(f"♻️ Resuming task {row['task_id']}: {len(episodes)} episodes left")
+        asyncio.create_task(download_episodes_background(
+            row["task_id"],
+            row["anime_session"],
+            episodes,
+            row["quality"],
+            row["language"],
+            row["download_directory"],
+            resume=resume,
+            done_before=done_before,
+        ))
+    for batch_id, rows in batches.items():
+        resume_batch(batch_id, rows)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,209 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds: from sub-second HTTP scrapes up to slow browser resolves and transfers
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+# Bytes per second for a whole transfer
+THROUGHPUT_BUCKETS = tuple(2 ** n * 1024 for n in range(6, 18, 2))  # 64 KiB/s .. 64 MiB/s
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}  # label values tuple -> value
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, e.g. retries or bytes transferred"""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+    def to_dict(self):
+        with self._lock:
+            return [{"labels": dict(zip(self.labelnames, k)), "value": v} for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down, e.g. pool occupancy"""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (durations, throughput) over fixed buckets"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of a `with` block, also when it raises"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def _snapshot(self):
+        with self._lock:
+            return [(k, list(v["counts"]), v["sum"], v["count"]) for k, v in self._values.items()]
+
+    def render(self):
+        lines = self._header()
+        for key, counts, total, count in self._snapshot():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+    def to_dict(self):
+        samples = []
+        for key, counts, total, count in self._snapshot():
+            samples.append({
+                "labels": dict(zip(self.labelnames, key)),
+                "count": count,
+                "sum": total,
+                "mean": total / count if count else None,
+                "buckets": {str(bound): n for bound, n in zip(self.buckets, counts)},
+            })
+        return samples
+
+
+class Registry:
+    """Holds metrics plus collectors that refresh gauges right before each scrape"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def add_collector(self, fn):
+        with self._lock:
+            self._collectors.append(fn)
+
+    def _collect(self):
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics)
+        for fn in collectors:
+            try:
+                fn()
+            except Exception as e:
+                print(f"⚠️ Metrics collector failed: {e}")
+        return metrics
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self._collect():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self):
+        return {
+            metric.name: {"type": metric.kind, "help": metric.documentation, "samples": metric.to_dict()}
+            for metric in self._collect()
+        }
+
+
+REGISTRY = Registry()
+
+
+def dump_json(path):
+    """Write every metric to `path` as JSON (used by the CLI at exit)"""
+    with open(path, "w") as f:
+        json.dump({"timestamp": time.time(), "metrics": REGISTRY.to_dict()}, f, indent=2)
+    print(f"📊 Metrics written to {path}")
+
+
+BROWSER_CREATE_SECONDS = Histogram(
+    "anime_dl_browser_create_seconds", "Time to launch a stealth Chrome instance")
+DDOS_CLEAR_SECONDS = Histogram(
+    "anime_dl_ddos_clear_seconds", "Time for a browser to get past the DDoS-Guard challenge")
+SCRAPE_SECONDS = Histogram(
+    "anime_dl_scrape_seconds", "Play page scrape time", ["method"])
+RESOLVE_SECONDS = Histogram(
+    "anime_dl_resolve_seconds", "Time to resolve a pahe link into download info", ["method"])
+RESOLVE_STEP_SECONDS = Histogram(
+    "anime_dl_resolve_step_seconds", "Browser resolver time per step (continue, redirect, form)", ["step"])
+BROWSER_WAIT_SECONDS = Histogram(
+    "anime_dl_browser_wait_seconds", "Time spent in each condition-based browser wait", ["step"])
+PIPELINE_STAGE_SECONDS = Histogram(
+    "anime_dl_pipeline_stage_seconds", "Time an episode spends in each pipeline stage", ["stage"])
+TRANSFER_SECONDS = Histogram(
+    "anime_dl_transfer_seconds", "Wall time of completed transfers", ["mode"])
+TRANSFER_THROUGHPUT = Histogram(
+    "anime_dl_transfer_throughput_bytes_per_second", "Average throughput of completed transfers", ["mode"],
+    buckets=THROUGHPUT_BUCKETS)
+TRANSFER_BYTES = Counter(
+    "anime_dl_transfer_bytes_total", "Bytes written by transfers", ["mode"])
+RETRIES = Counter(
+    "anime_dl_retries_total", "Retries by operation and cause", ["operation", "cause"])
+POOL_OCCUPANCY = Gauge(
+    "anime_dl_pool_occupancy", "Browser pool and transfer slot usage", ["pool", "state"])
@@ -0,0 +1,222 @@
+import queue
+import threading
+import time
+from config import (
+    PIPELINE_SCRAPE_WORKERS,
+    PIPELINE_RESOLVE_WORKERS,
+    PIPELINE_TRANSFER_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_SCRAPE_RETRIES,
+)
+from scraper import scrape_download_links
+from resolver import resolve_download_info
+from link_cache import get_link_cache
+from cancel import CancelToken
+from transfer import advanced_download_with_progress
+from metrics import PIPELINE_STAGE_SECONDS
+
+_STOP = object()
+
+
+class Pipeline:
+    """
+    Runs items through a chain of stages. Every stage has its own worker threads
+    and reads from a bounded queue, so a slow stage applies back-pressure instead
+    of letting work pile up, while faster stages keep running ahead of it.
+
+    `stages` is a list of (name, fn, workers). Each fn takes an item and returns
+    the item to hand to the next stage, or None to drop it.
+    """
+
+    def __init__(self, stages, queue_size=None):
+        self.stages = stages
+        self.queue_size = queue_size if queue_size is not None else PIPELINE_QUEUE_SIZE
+        self.timings = {name: [] for name, _, _ in stages}
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def _worker(self, index, inbox, outbox, remaining):
+        name, fn, _ = self.stages[index]
+        while True:
+            item = inbox.get()
+            if item is _STOP:
+                break
+            position, payload = item
+            start = time.time()
+            try:
+                result = fn(payload)
+            except Exception as e:
+                print(f"❌ Stage '{name}' failed: {e}")
+                with self._lock:
+                    self.failures.append((name, payload, e))
+                result = None
+            elapsed = time.time() - start
+            with self._lock:
+                self.timings[name].append(elapsed)
+            PIPELINE_STAGE_SECONDS.observe(elapsed, stage=name)
+            if result is not None:
+                outbox.put((position, result))
+
+        # Last worker out tells the next stage there is nothing more coming
+        with self._lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        if last and index + 1 < len(self.stages):
+            for _ in range(self.stages[index + 1][2]):
+                outbox.put(_STOP)
+
+    def run(self, items):
+        """Push `items` through every stage and return the survivors in input order"""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results = queue.Queue()
+        remaining = [workers for _, _, workers in self.stages]
+        threads = []
+        for index, (_, _, workers) in enumerate(self.stages):
+            outbox = queues[index + 1] if index + 1 < len(self.stages) else results
+            for _ in range(workers):
+                t = threading.Thread(target=self._worker, args=(index, queues[index], outbox, remaining), daemon=True)
+                t.start()
+                threads.append(t)
+
+        for position, item in enumerate(items):
+            queues[0].put((position, item))
+        for _ in range(self.stages[0][2]):
+            queues[0].put(_STOP)
+
+        for t in threads:
+            t.join()
+
+        collected = []
+        while not results.empty():
+            collected.append(results.get())
+        return [item for _, item in sorted(collected, key=lambda pair: pair[0])]
+
+
+def run_episode_pipeline(anime_session, episodes, quality, language, download_directory="./",
+                         filename_for=None, on_done=None, sm=None, timings=None,
+                         on_stage=None, resume=None, cancel_token=None, episode_tokens=None,
+                         progress_for=None,
+                         scrape_workers=None, resolve_workers=None, transfer_workers=None):
+    """
+    Scrape, resolve and download `episodes` with the three steps overlapping, so
+    episode N+1 is scraped and resolved while episode N is still transferring.
+    `filename_for(episode)` names files the resolver could not name, and
+    `on_done(episode, success)` is called as each episode leaves the pipeline.
+    Passing the SessionManager as `sm` lets play pages be parsed over HTTP, and a
+    `timings` dict is filled with per-stage durations in seconds.
+    `on_stage(episode, stage, item)` is called after "scraped" and "resolved" and
+    before "transferring", `progress_for(episode)` may return a transfer progress
+    callback, and
+    `resume` maps episode sessions (or keys, see below) to a saved
+    {"raw_url", "download_info"} so those episodes skip the steps they already completed.
+    Each episode runs under a child of `cancel_token`; pass an `episode_tokens`
+    dict to receive them (keyed by episode session) and cancel single episodes.
+    An episode dict may carry its own "anime_session", "quality", "language"
+    and "download_directory", so one run can serve several series, and a "key"
+    that replaces the session as its `episode_tokens` and `resume` key.
+    Returns a list of (episode, success) in episode order.
+    """
+    def finish(item, success):
+        item['success'] = success
+        if on_done:
+            on_done(item['episode'], success)
+        return item
+
+    def scrape(item):
+        episode = item['episode']
+        if item.get('raw_url'):
+            return item
+        print(f"\n🎬 Episode {episode['episode']}")
+        if on_stage:
+            on_stage(episode, "scraping", item)
+        links = scrape_download_links(
+            item['anime_session'], episode["session"],
+            max_retries=PIPELINE_SCRAPE_RETRIES, sm=sm, cancel_token=item['cancel_token']
+        )
+        raw_url = links.get(f"{item['quality']}_{item['language']}")
+        if not raw_url:
+            print(f"⚠️ {item['quality']}p {item['language'].upper()} not available for episode {episode['episode']}")
+            print("Available:", ", ".join(links.keys()))
+            finish(item, False)
+            return None
+        item['raw_url'] = raw_url
+        if on_stage:
+            on_stage(episode, "scraped", item)
+        return item
+
+    def resolve(item):
+        episode = item['episode']
+        if item.get('download_info'):
+            return item
+        download_info = resolve_download_info(item['raw_url'], cancel_token=item['cancel_token'])
+        if not download_info:
+            print(f"⚠️ Could not resolve download info for episode {episode['episode']}")
+            # The scraped link may have gone stale; make the next attempt scrape again
+            get_link_cache().invalidate(item['anime_session'], episode["session"])
+            finish(item, False)
+            return None
+        if not download_info.get('filename') and filename_for:
+            download_info['filename'] = filename_for(episode)
+        item['download_info'] = download_info
+        if on_stage:
+            on_stage(episode, "resolved", item)
+        return item
+
+    def transfer(item):
+        episode = item['episode']
+        if on_stage:
+            on_stage(episode, "transferring", item)
+        success = advanced_download_with_progress(
+            item['download_info'], item['download_directory'], cancel_token=item['cancel_token'],
+            progress_callback=progress_for(episode) if progress_for else None
+        )
+        if success:
+            print(f"✅ Episode {episode['episode']} downloaded successfully")
+        else:
+            print(f"❌ Failed to download Episode {episode['episode']}")
+        return finish(item, success)
+
+    def guarded(fn):
+        # An episode dropped by a crashing stage still counts as finished (and failed)
+        def run(item):
+            if item['cancel_token'].cancelled:
+                # Cancelled while queued: drop it without doing the work
+                print(f"🛑 Skipping cancelled episode {item['episode']['episode']}")
+                finish(item, False)
+                return None
+            try:
+                return fn(item)
+            except Exception:
+                finish(item, False)
+                raise
+        return run
+
+    pipeline = Pipeline([
+        ("scrape", guarded(scrape), scrape_workers or PIPELINE_SCRAPE_WORKERS),
+        ("resolve", guarded(resolve), resolve_workers or PIPELINE_RESOLVE_WORKERS),
+        ("transfer", guarded(transfer), transfer_workers or PIPELINE_TRANSFER_WORKERS),
+    ])
+    resume = resume or {}
+    if episode_tokens is None:
+        episode_tokens = {}
+    items = []
+    for episode in episodes:
+        key = episode.get("key", episode["session"])
+        saved = resume.get(key) or {}
+        token = episode_tokens.get(key) or CancelToken(parent=cancel_token)
+        episode_tokens[key] = token
+        items.append({
+            'episode': episode,
+            'anime_session': episode.get("anime_session", anime_session),
+            'quality': episode.get("quality", quality),
+            'language': episode.get("language", language),
+            'download_directory': episode.get("download_directory", download_directory),
+            'raw_url': saved.get('raw_url'),
+            'download_info': saved.get('download_info'),
+            'cancel_token': token,
+        })
+    finished = pipeline.run(items)
+    if timings is not None:
+        timings.update(pipeline.timings)
+    succeeded = {id(item['episode']) for item in finished if item.get('success')}
+    return [(episode, id(episode) in succeeded) for episode in episodes]
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+from config import PROGRESS_MIN_INTERVAL, PROGRESS_EWMA_ALPHA
+
+
+class TaskProgress:
+    """
+    Byte-level progress of one download task. Transfer callbacks and stage
+    changes are folded into a snapshot (bytes done, EWMA throughput, ETA) that
+    is pushed to event-stream subscribers. Byte updates are coalesced to at most
+    one event per PROGRESS_MIN_INTERVAL; stage changes are always sent.
+    """
+
+    def __init__(self, task_id, total_episodes, completed_before=0, min_interval=None, alpha=None):
+        self.task_id = task_id
+        self.total_episodes = total_episodes
+        self.completed_before = completed_before  # episodes finished before a restart
+        self.min_interval = min_interval if min_interval is not None else PROGRESS_MIN_INTERVAL
+        self.alpha = alpha if alpha is not None else PROGRESS_EWMA_ALPHA
+        self._lock = threading.Lock()
+        self._episodes = {}  # episode number -> {"stage", "bytes_done", "bytes_total"}
+        self._subscribers = []  # (loop, asyncio.Queue)
+        self._throughput = 0.0
+        self._reported = {}  # episode -> bytes_done at its last report
+        self._transferred = 0  # bytes actually moved while this tracker watched
+        self._sample_bytes = 0
+        self._sample_time = time.monotonic()
+        self._last_publish = 0.0
+        self.finished = False
+
+    def _episode(self, episode):
+        return self._episodes.setdefault(episode, {"stage": "pending", "bytes_done": 0, "bytes_total": None})
+
+    def _totals(self):
+        done = sum(e["bytes_done"] for e in self._episodes.values())
+        known = [e for e in self._episodes.values() if e["bytes_total"]]
+        remaining = sum(e["bytes_total"] - e["bytes_done"] for e in known if e["stage"] == "transferring")
+        return done, remaining
+
+    def _snapshot(self, event_type, episode=None):
+        done, remaining = self._totals()
+        finished = self.completed_before + sum(1 for e in self._episodes.values() if e["stage"] in ("complete", "failed", "cancelled"))
+        partial = sum(
+            e["bytes_done"] / e["bytes_total"]
+            for e in self._episodes.values()
+            if e["stage"] == "transferring" and e["bytes_total"]
+        )
+        return {
+            "type": event_type,
+            "task_id": self.task_id,
+            "episode": episode,
+            "stage": self._episodes[episode]["stage"] if episode in self._episodes else None,
+            "progress": (finished + partial) / self.total_episodes * 100 if self.total_episodes else 0.0,
+            "bytes_done": done,
+            "throughput": self._throughput,
+            "eta": remaining / self._throughput if self._throughput > 0 and remaining else None,
+            "episodes": {str(k): dict(v) for k, v in self._episodes.items()},
+        }
+
+    def _publish(self, event):
+        self._last_publish = time.monotonic()
+        for loop, queue in list(self._subscribers):
+            loop.call_soon_threadsafe(_offer, queue, event)
+
+    def stage(self, episode, stage):
+        """Record a stage change ("scraping", "transferring", "complete", ...) and publish it"""
+        with self._lock:
+            self._episode(episode)["stage"] = stage
+            event = self._snapshot("stage", episode)
+            self._publish(event)
+        return event
+
+    def bytes(self, episode, done, total=None):
+        """
+        Record transfer progress for `episode`. Returns the published snapshot,
+        or None when the update was coalesced into a later one.
+        """
+        with self._lock:
+            state = self._episode(episode)
+            state["bytes_done"] = done
+            if total:
+                state["bytes_total"] = total
+            now = time.monotonic()
+            # An episode's first report is what a resumed transfer already had on
+            # disk, and a drop means it restarted; neither is throughput
+            previous = self._reported.get(episode)
+            self._reported[episode] = done
+            if previous is not None and done > previous:
+                self._transferred += done - previous
+            elif not self._throughput and self._transferred == self._sample_bytes:
+                # Nothing has moved yet; don't average the scrape/resolve wait into the rate
+                self._sample_time = now
+            elapsed = now - self._sample_time
+            if elapsed >= self.min_interval:
+                rate = (self._transferred - self._sample_bytes) / elapsed
+                self._throughput = rate if not self._throughput else (
+                    self.alpha * rate + (1 - self.alpha) * self._throughput
+                )
+                self._sample_bytes, self._sample_time = self._transferred, now
+            if now - self._last_publish < self.min_interval:
+                return None
+            event = self._snapshot("progress", episode)
+            self._publish(event)
+        return event
+
+    def snapshot(self):
+        with self._lock:
+            return self._snapshot("snapshot")
+
+    def finish(self, status):
+        """Publish the final event; subscribers end their streams on it"""
+        with self._lock:
+            self.finished = True
+            event = self._snapshot("end")
+            event["status"] = status
+            self._publish(event)
+
+    def subscribe(self, loop):
+        queue = asyncio.Queue(maxsize=256)
+        with self._lock:
+            self._subscribers.append((loop, queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers = [(l, q) for l, q in self._subscribers if q is not queue]
+
+
+def _offer(queue, event):
+    # A slow client loses intermediate progress events rather than stalling the transfer
+    if queue.full():
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+    queue.put_nowait(event)
@@ -0,0 +1,48 @@
+import threading
+import time
+from config import API_REQUESTS_PER_SECOND
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def set_rate(self, rate, capacity=None):
+        """Change the refill rate at runtime; a rate of 0 or None disables limiting"""
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            self.capacity = capacity if capacity is not None else rate
+            if self.rate:
+                self._tokens = min(self._tokens, self.capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available and take them"""
+        while True:
+            with self._lock:
+                if not self.rate:
+                    return
+                self._refill()
+                # Requests larger than the bucket are let through once it is full
+                needed = min(tokens, self.capacity)
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Paces every request to the origin (API, play pages, clearance probes), shared by all threads
+api_rate_limiter = TokenBucket(API_REQUESTS_PER_SECOND)
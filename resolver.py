@@ -1,15 +1,135 @@
 import time
 import os
-from time import sleep
+import re
+import html
+import requests
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import ElementClickInterceptedException, NoSuchElementException, TimeoutException
+from selenium.common.exceptions import ElementClickInterceptedException
 from browser import (
-    create_stealth_driver,
-    set_adblock,
-    guarded_click,
+    get_driver_pool,
+    apply_interception,
+    wait_for,
+    network_idle,
 )
+from config import RESOLVER_HTTP_ENABLED, RESOLVER_COUNTDOWN_TIMEOUT
+from session_mgr import DEFAULT_USER_AGENT
+from cancel import check_cancelled
+from metrics import RESOLVE_SECONDS, RESOLVE_STEP_SECONDS
+
+_KWIK_LINK_RE = re.compile(r"https?://[^\s\"'<>]+/f/[\w-]+")
+_KWIK_PACKED_RE = re.compile(
+    r'\(\s*"([^"]+)"\s*,\s*\d+\s*,\s*"([^"]+)"\s*,\s*(\d+)\s*,\s*(\d+)\s*,\s*\d+\s*\)\s*\)'
+)
+_KWIK_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ+/"
+
+
+def find_kwik_link(page_html):
+    """Find the kwik /f/ link that the intermediate page's Continue button points to"""
+    match = _KWIK_LINK_RE.search(page_html or "")
+    return html.unescape(match.group(0)) if match else None
+
+
+def _kwik_to_int(digits, base):
+    symbols = _KWIK_ALPHABET[:base]
+    value = 0
+    for power, ch in enumerate(reversed(digits)):
+        index = symbols.find(ch)
+        if index != -1:
+            value += index * base ** power
+    return value
+
+
+def decode_kwik_packed(page_html):
+    """
+    Evaluate kwik's `eval(function(h,u,n,t,e,r){...}(...))` packer in Python.
+    Returns the decoded markup/script, or None when the page has no packed script.
+    """
+    match = _KWIK_PACKED_RE.search(page_html or "")
+    if not match:
+        return None
+    data, charset, offset, base = match.group(1), match.group(2), int(match.group(3)), int(match.group(4))
+    separator = charset[base]
+    out = []
+    for token in data.split(separator)[:-1]:
+        for index, ch in enumerate(charset):
+            token = token.replace(ch, str(index))
+        out.append(chr(_kwik_to_int(token, base) - offset))
+    decoded = "".join(out)
+    try:
+        return decoded.encode("latin-1").decode("utf-8")  # decodeURIComponent(escape(r))
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return decoded
+
+
+def parse_kwik_form(markup):
+    """Pull the POST form action and its hidden inputs out of decoded kwik markup"""
+    form = re.search(r'<form[^>]*action="([^"]+)"[^>]*>(.*?)</form>', markup or "", re.S | re.I)
+    if not form:
+        return None, {}
+    fields = {}
+    for tag in re.findall(r"<input[^>]*>", form.group(2), re.I):
+        name = re.search(r'name="([^"]*)"', tag)
+        value = re.search(r'value="([^"]*)"', tag)
+        if name and name.group(1):
+            fields[html.unescape(name.group(1))] = html.unescape(value.group(1)) if value else ""
+    return html.unescape(form.group(1)), fields
+
+
+def parse_kwik_title(page_html):
+    """Episode title from the kwik page's `.title` element, as the browser path reads it"""
+    match = re.search(
+        r'<(\w+)[^>]*class="[^"]*\btitle\b[^"]*"[^>]*>(.*?)</\1\s*>', page_html or "", re.S | re.I
+    )
+    if not match:
+        return None
+    title = " ".join(html.unescape(re.sub(r"<[^>]+>", "", match.group(2))).split())
+    return title or None
+
+
+def resolve_download_info_http(intermediate_url, timeout=30):
+    """
+    Resolve download information with plain HTTP: follow the intermediate page to
+    kwik, decode the packed form and collect its token and cookies.
+    Returns the same dict as the browser resolver, or None if the markup is not understood.
+    """
+    sess = requests.Session()
+    sess.headers.update({"User-Agent": DEFAULT_USER_AGENT})
+    try:
+        kwik_url = intermediate_url if "/f/" in intermediate_url else None
+        if not kwik_url:
+            r = sess.get(intermediate_url, timeout=timeout)
+            r.raise_for_status()
+            kwik_url = find_kwik_link(r.text)
+            if not kwik_url:
+                print("⚠️ HTTP resolver: no kwik link on intermediate page")
+                return None
+        r = sess.get(kwik_url, headers={"Referer": intermediate_url}, timeout=timeout)
+        r.raise_for_status()
+        page_html = r.text
+    except requests.exceptions.RequestException as e:
+        print(f"⚠️ HTTP resolver request failed: {e}")
+        return None
+
+    decoded = decode_kwik_packed(page_html) or page_html
+    action, fields = parse_kwik_form(decoded)
+    if not action or "http" not in action:
+        print("⚠️ HTTP resolver: download form not found")
+        return None
+
+    title = parse_kwik_title(page_html)
+    print(f"✅ Download URL extracted over HTTP: {action}")
+    return {
+        'url': action,
+        'form_data': fields,
+        'cookies': sess.cookies.get_dict(),
+        'headers': {
+            'User-Agent': DEFAULT_USER_AGENT,
+            'Referer': r.url,
+            'Content-Type': 'application/x-www-form-urlencoded'
+        },
+        'filename': title.replace(" ", "_") if title else None
+    }
 
 
 def _remove_ads_and_overlays(driver):
@@ -39,12 +159,50 @@ def _remove_ads_and_overlays(driver):
             continue
 
 
-def resolve_download_info(intermediate_url):
+def _continue_armed(driver):
+    """Condition: the Continue link points at kwik, i.e. the countdown has finished"""
+    for element in driver.find_elements(By.CLASS_NAME, "redirect"):
+        if find_kwik_link(element.get_attribute("href") or ""):
+            return True
+    return False
+
+
+def _redirect_target(driver):
+    """Condition: the browser reached kwik or a direct file; returns the URL"""
+    current_url = driver.current_url
+    if "/d/" in current_url or current_url.endswith(".mp4") or "kwik." in current_url:
+        return current_url
+    return False
+
+
+def resolve_download_info(intermediate_url, cancel_token=None):
     """
     Resolve download information including URL, form data, cookies, and filename.
     Returns a dict with all necessary info for downloading.
+    Tries the HTTP resolver first and falls back to driving a browser.
     """
-    driver = create_stealth_driver(headless=True)
+    if RESOLVER_HTTP_ENABLED:
+        check_cancelled(cancel_token)
+        with RESOLVE_SECONDS.time(method="http"):
+            download_info = resolve_download_info_http(intermediate_url)
+        if download_info:
+            return download_info
+        print("ℹ️ Falling back to browser resolver")
+    with RESOLVE_SECONDS.time(method="browser"):
+        return resolve_download_info_browser(intermediate_url, cancel_token)
+
+
+def resolve_download_info_browser(intermediate_url, cancel_token=None):
+    """
+    Resolve download information by driving a pooled Chrome through the
+    intermediate and kwik pages. Cancelling `cancel_token` quits the driver
+    and raises DownloadCancelled.
+    """
+    check_cancelled(cancel_token)
+    pool = get_driver_pool()
+    driver = pool.checkout()
+    if cancel_token is not None:
+        cancel_token.on_cancel(driver.quit)
     download_info = {
         'url': None,
         'form_data': {},
@@ -53,9 +211,17 @@ def resolve_download_info(intermediate_url):
         'filename': None
     }
     
+    step_started = time.monotonic()
+
+    def step_done(step):
+        nonlocal step_started
+        now = time.monotonic()
+        RESOLVE_STEP_SECONDS.observe(now - step_started, step=step)
+        step_started = now
+
     try:
         print("🌐 Navigating to intermediate URL...")
-        set_adblock(driver, True)
+        apply_interception(driver, "kwik")
         driver.get(intermediate_url)
 
         # Continue button handling with improved logic
@@ -69,41 +235,39 @@ def resolve_download_info(intermediate_url):
 
             # Wait for the "Continue" button to load and be visible
             continue_button_locator = (By.CLASS_NAME, "redirect")
-            WebDriverWait(driver, 60).until(EC.visibility_of_element_located(continue_button_locator))
+            wait_for(driver, EC.visibility_of_element_located(continue_button_locator), 60, "continue_visible")
 
-            # Wait an additional 6 seconds before attempting to click the "Continue" button
-            sleep(6)
+            # The page's countdown script fills in the kwik link when it finishes;
+            # click as soon as it does, or try anyway once the timeout passes
+            if not wait_for(driver, _continue_armed, RESOLVER_COUNTDOWN_TIMEOUT, "countdown", required=False):
+                print("⚠️ Continue link not armed yet, clicking anyway")
 
             # Retry clicking the continue button a few times if necessary
             for _ in range(3):
                 try:
-                    WebDriverWait(driver, 10).until(EC.element_to_be_clickable(continue_button_locator))
+                    wait_for(driver, EC.element_to_be_clickable(continue_button_locator), 10, "continue_clickable")
                     continue_button = driver.find_element(*continue_button_locator)
                     driver.execute_script("arguments[0].click();", continue_button)
                     print("✅ Continue button clicked successfully")
                     break  # Exit loop if click is successful
                 except ElementClickInterceptedException:
                     print("Click was intercepted, trying again...")
-                    sleep(2)
+                    _remove_ads_and_overlays(driver)
         except Exception as e:
             print("⚠️ Continue handling error:", e)
+        step_done("continue")
 
         # Progress by URL/domain heuristics
-        deadline = time.time() + 30
-        while time.time() < deadline:
-            current_url = driver.current_url
-            if "/d/" in current_url or current_url.endswith(".mp4"):
-                download_info['url'] = current_url
-                print("✅ Direct download URL reached:", current_url)
-                break
-            if "kwik.si" in current_url:
-                break
-            time.sleep(0.5)
+        current_url = wait_for(driver, _redirect_target, 30, "redirect", required=False)
+        if current_url and ("/d/" in current_url or current_url.endswith(".mp4")):
+            download_info['url'] = current_url
+            print("✅ Direct download URL reached:", current_url)
+        step_done("redirect")
 
         # Extract episode title for filename
         try:
             title_locator = (By.CLASS_NAME, "title")
-            WebDriverWait(driver, 10).until(EC.visibility_of_element_located(title_locator))
+            wait_for(driver, EC.visibility_of_element_located(title_locator), 10, "kwik_title")
             title_element = driver.find_element(*title_locator)
             episode_title = title_element.text.strip()
             filename = episode_title.replace(" ", "_")
@@ -114,8 +278,8 @@ def resolve_download_info(intermediate_url):
 
         # Extract download URL and form data
         print("🔍 Extracting download information...")
-        set_adblock(driver, False)
-        time.sleep(1.0)
+        apply_interception(driver, None)
+        wait_for(driver, network_idle(quiet=0.3), 5, "kwik_idle", required=False)
         
         # Handle potential ad pages or intermediate pages
         download_button_locator = (By.CSS_SELECTOR, "button[type='submit']")
@@ -123,7 +287,7 @@ def resolve_download_info(intermediate_url):
         
         for attempt in range(retries):
             try:
-                download_button = WebDriverWait(driver, 45).until(EC.element_to_be_clickable(download_button_locator))
+                download_button = wait_for(driver, EC.element_to_be_clickable(download_button_locator), 45, "form")
                 form = download_button.find_element(By.XPATH, './ancestor::form')
                 download_url = form.get_attribute('action')
                 
@@ -133,8 +297,9 @@ def resolve_download_info(intermediate_url):
                     break
             except ElementClickInterceptedException as e:
                 print(f"Attempt {attempt + 1} failed due to element click interception: {e}")
-                sleep(2)
+                _remove_ads_and_overlays(driver)
 
+        step_done("form")
         if not download_info['url']:
             raise Exception("Failed to extract the download URL after retries.")
 
@@ -162,10 +327,13 @@ def resolve_download_info(intermediate_url):
         return download_info
 
     except Exception as e:
+        check_cancelled(cancel_token)
         print(f"⚠️ Error resolving download info: {e}")
         return None
     finally:
-        driver.quit()
+        if cancel_token is not None:
+            cancel_token.remove(driver.quit)
+        pool.checkin(driver)
 
 
 def resolve_download_url(intermediate_url):
@@ -0,0 +1,100 @@
+import threading
+import urllib.parse
+from contextlib import contextmanager
+from config import TRANSFER_MAX_CONNECTIONS, TRANSFER_MAX_PER_HOST, TRANSFER_BANDWIDTH_LIMIT
+from ratelimit import TokenBucket
+from cancel import check_cancelled
+from metrics import POOL_OCCUPANCY, REGISTRY
+
+
+class TransferScheduler:
+    """
+    Process-wide gate for download connections: a global connection limit, a
+    per-host limit and a shared token-bucket bandwidth cap. Limits can be
+    changed at runtime and take effect for waiting and in-flight transfers.
+    """
+
+    def __init__(self, max_connections=None, max_per_host=None, bandwidth=None):
+        self.max_connections = max_connections if max_connections is not None else TRANSFER_MAX_CONNECTIONS
+        self.max_per_host = max_per_host if max_per_host is not None else TRANSFER_MAX_PER_HOST
+        self.bandwidth = bandwidth if bandwidth is not None else TRANSFER_BANDWIDTH_LIMIT
+        self._bucket = TokenBucket(self.bandwidth)
+        self._cond = threading.Condition()
+        self._active = {}  # host -> open connections
+        self._total = 0
+        self._waiting = 0
+
+    def _has_room(self, host):
+        return self._total < self.max_connections and self._active.get(host, 0) < self.max_per_host
+
+    @contextmanager
+    def connection(self, url, cancel_token=None):
+        """Hold one connection slot for `url`'s host, waiting until the limits allow it"""
+        host = urllib.parse.urlparse(url).hostname or ""
+        with self._cond:
+            self._waiting += 1
+            try:
+                while not self._has_room(host):
+                    # Wake up periodically so a cancelled transfer leaves the queue
+                    self._cond.wait(timeout=0.5 if cancel_token is not None else None)
+                    check_cancelled(cancel_token)
+            finally:
+                self._waiting -= 1
+            self._total += 1
+            self._active[host] = self._active.get(host, 0) + 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._total -= 1
+                self._active[host] -= 1
+                if not self._active[host]:
+                    del self._active[host]
+                self._cond.notify_all()
+
+    def throttle(self, nbytes):
+        """Account for `nbytes` received, sleeping as needed to respect the bandwidth cap"""
+        self._bucket.acquire(nbytes)
+
+    def set_limits(self, max_connections=None, max_per_host=None, bandwidth=None):
+        with self._cond:
+            if max_connections is not None:
+                self.max_connections = max_connections
+            if max_per_host is not None:
+                self.max_per_host = max_per_host
+            if bandwidth is not None:
+                self.bandwidth = bandwidth
+                self._bucket.set_rate(bandwidth)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "active_transfers": self._total,
+                "queue_depth": self._waiting,
+                "per_host": dict(self._active),
+                "max_connections": self.max_connections,
+                "max_per_host": self.max_per_host,
+                "bandwidth_limit": self.bandwidth,
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_transfer_scheduler():
+    """Get or create the process-wide transfer scheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = TransferScheduler()
+            REGISTRY.add_collector(_collect_transfer_metrics)
+        return _scheduler
+
+
+def _collect_transfer_metrics():
+    stats = _scheduler.stats()
+    POOL_OCCUPANCY.set(stats["active_transfers"], pool="transfer", state="active")
+    POOL_OCCUPANCY.set(stats["queue_depth"], pool="transfer", state="waiting")
+    POOL_OCCUPANCY.set(stats["max_connections"], pool="transfer", state="limit")
@@ -1,93 +1,358 @@
 import re
 import time
+import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
-from browser import create_stealth_driver, guarded_click, cleanup_browser_data
+from browser import get_driver_pool, guarded_click, wait_for, close_new_tabs_and_return, apply_interception
+from link_cache import get_link_cache
+from config import (
+    BASE_ORIGIN,
+    SCRAPER_HTTP_ENABLED,
+    QUALITIES_BATCH_HTTP_WORKERS,
+    SCRAPER_TABS,
+    SCRAPER_TAB_TIMEOUT,
+    BROWSER_WAIT_POLL,
+)
+from cancel import DownloadCancelled, cancel_callback, cancellable_sleep, check_cancelled
+from metrics import SCRAPE_SECONDS, RETRIES
 
 
-def scrape_download_links(anime_session, episode_session, max_retries=2):
-    """Scrape download links with retry logic and better error handling"""
-    url = f"https://animepahe.ru/play/{anime_session}/{episode_session}"
+def _link_key(text):
+    """Map a download anchor's text (e.g. "SubsPlease · 720p (120MB) eng") to a "720_eng" key"""
+    match = re.search(r"(\d{3,4})p", text)
+    if not match:
+        return None
+    quality = match.group(1)
+    if "eng" in text.lower():
+        lang = "eng"
+    elif "chi" in text.lower():
+        lang = "chi"
+    else:
+        lang = "jpn"
+    return f"{quality}_{lang}"
+
+
+class _PickDownloadParser(HTMLParser):
+    """Collects (href, text) for every anchor inside the #pickDownload dropdown"""
+
+    def __init__(self):
+        super().__init__()
+        self.anchors = []
+        self._container = None  # tag name of #pickDownload once entered
+        self._depth = 0
+        self._done = False  # set once #pickDownload has closed; nothing after it counts
+        self._href = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if self._done:
+            return
+        attrs = dict(attrs)
+        if self._container is None:
+            if attrs.get("id") == "pickDownload":
+                self._container = tag
+                self._depth = 1
+            return
+        if tag == self._container:
+            self._depth += 1
+        elif tag == "a" and self._depth > 0:
+            self._href = attrs.get("href")
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if self._done or self._container is None or self._depth == 0:
+            return
+        if tag == "a" and self._href is not None:
+            self.anchors.append((self._href, " ".join("".join(self._text).split())))
+            self._href = None
+        elif tag == self._container:
+            self._depth -= 1
+            if self._depth == 0:
+                self._done = True
+                self._href = None
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._text.append(data)
+
+
+def parse_download_links(page_html):
+    """Extract {"720_eng": url} from play page markup without a browser"""
+    parser = _PickDownloadParser()
+    parser.feed(page_html or "")
+    links = {}
+    for href, text in parser.anchors:
+        key = _link_key(text)
+        if href and key:
+            links[key] = href
+    return links
+
+
+def _scrape_play_page_http(sm, url):
+    """Fetch the play page through the cleared SessionManager session and parse the dropdown"""
+    r = sm.get(url, headers={"Accept": "text/html,application/xhtml+xml"}, timeout=30)
+    r.raise_for_status()
+    return parse_download_links(r.text)
+
+
+def _scrape_play_page(driver, url):
+    """Open the play page in `driver` and read the links out of the download dropdown"""
+    apply_interception(driver, "play")
+    driver.get(url)
+    
+    # Wait for page to load
+    wait_for(driver, EC.presence_of_element_located((By.TAG_NAME, "body")), 15, "play_body")
+    
+    # Look for download button
+    download_button = wait_for(driver, EC.element_to_be_clickable((By.ID, "downloadMenu")), 20, "download_menu")
+    
+    # Click download button
+    try:
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", download_button)
+        download_button.click()
+    except Exception as e:
+        print(f"⚠️ Direct click failed, trying guarded click: {e}")
+        guarded_click(driver, download_button, max_retries=3)
+    
+    # Wait for dropdown to appear
+    dropdown = wait_for(driver, EC.visibility_of_element_located((By.ID, "pickDownload")), 20, "download_dropdown")
+    
+    # Extract download links
+    anchors = dropdown.find_elements(By.TAG_NAME, "a")
+    links = {}
+    
+    for a in anchors:
+        href = a.get_attribute("href")
+        key = _link_key(a.text.strip())
+        if href and key:
+            links[key] = href
+    return links
+
+
+# Marks the outgoing document so a tab isn't harvested before the new page replaces it
+_NAVIGATE_SCRIPT = "document.__anime_dl_stale = true; window.location.href = arguments[0];"
+_HARVEST_SCRIPT = """
+if (document.__anime_dl_stale) { return null; }
+var anchors = document.querySelectorAll('#pickDownload a');
+return {
+    ready: document.readyState,
+    menu: !!document.getElementById('downloadMenu'),
+    anchors: Array.prototype.map.call(anchors, function (a) { return [a.href, a.textContent]; })
+};
+"""
+
+
+def _close_popups(driver, keep):
+    """Close every tab that isn't in `keep` (ad popups), leaving the worker tabs alone"""
+    for handle in driver.window_handles:
+        if handle not in keep:
+            try:
+                driver.switch_to.window(handle)
+                driver.close()
+            except Exception:
+                pass
+
+
+def scrape_play_pages_tabs(driver, urls, tabs=None, timeout=None, max_retries=2, cancel_token=None):
+    """
+    Scrape several play pages at once in one driver, yielding (url, links, error)
+    as each finishes. Up to `tabs` worker tabs navigate in parallel; each is
+    polled for the #pickDownload anchors and given the next URL once done.
+    Popups opened by ads are closed without disturbing the workers.
+    """
+    tabs = tabs or SCRAPER_TABS
+    timeout = timeout or SCRAPER_TAB_TIMEOUT
+    todo = deque((url, 1) for url in urls)
+    base = driver.current_window_handle
+    idle = []
+    busy = {}  # handle -> [url, attempt, started, menu clicked]
+    try:
+        while todo or busy:
+            check_cancelled(cancel_token)
+            while todo and len(idle) + len(busy) < tabs:
+                driver.switch_to.new_window("tab")
+                apply_interception(driver, "play")
+                idle.append(driver.current_window_handle)
+            while todo and idle:
+                handle = idle.pop()
+                url, attempt = todo.popleft()
+                driver.switch_to.window(handle)
+                driver.execute_script(_NAVIGATE_SCRIPT, url)
+                busy[handle] = [url, attempt, time.monotonic(), False]
+            _close_popups(driver, set(idle) | set(busy) | {base})
+
+            for handle, state in list(busy.items()):
+                url, attempt, started, clicked = state
+                links, error, cause = {}, None, None
+                try:
+                    driver.switch_to.window(handle)
+                    page = driver.execute_script(_HARVEST_SCRIPT)
+                except Exception as e:
+                    # The tab crashed or was closed; drop it and open another next round
+                    page, error, cause = None, str(e), "error"
+                    del busy[handle]
+                    handle = None
+                if page and page["anchors"]:
+                    for href, text in page["anchors"]:
+                        key = _link_key(" ".join(text.split()))
+                        if href and key:
+                            links[key] = href
+                    if not links and page["ready"] == "complete":
+                        error, cause = "No download links found", "no_links"
+                elif page and page["ready"] == "complete" and page["menu"] and not clicked:
+                    driver.execute_script("document.getElementById('downloadMenu').click();")
+                    state[3] = True
+                if not links and error is None:
+                    if time.monotonic() - started < timeout:
+                        continue
+                    error, cause = f"Play page not ready after {timeout}s", "timeout"
+
+                SCRAPE_SECONDS.observe(time.monotonic() - started, method="tabs")
+                if handle is not None:
+                    del busy[handle]
+                    idle.append(handle)
+                if links:
+                    yield url, links, None
+                elif attempt < max_retries:
+                    RETRIES.inc(operation="scrape", cause=cause)
+                    todo.append((url, attempt + 1))
+                else:
+                    yield url, {}, error
+            if busy:
+                cancellable_sleep(cancel_token, BROWSER_WAIT_POLL)
+    finally:
+        close_new_tabs_and_return(driver, base)
+
+
+def scrape_download_links(anime_session, episode_session, max_retries=2, use_cache=True, sm=None, cancel_token=None):
+    """
+    Scrape download links with retry logic and better error handling.
+    When a SessionManager is given the play page is parsed over HTTP first,
+    and a browser is only used if that yields nothing. Cancelling
+    `cancel_token` quits the driver in use and raises DownloadCancelled.
+    """
+    if use_cache:
+        cached = get_link_cache().get(anime_session, episode_session)
+        if cached:
+            print(f"⚡ Using cached download links for episode {episode_session}")
+            return cached
+
+    url = f"{BASE_ORIGIN}/play/{anime_session}/{episode_session}"
+
+    if sm is not None and SCRAPER_HTTP_ENABLED:
+        check_cancelled(cancel_token)
+        try:
+            with SCRAPE_SECONDS.time(method="http"):
+                links = _scrape_play_page_http(sm, url)
+            if links:
+                print(f"✅ Parsed {len(links)} download links over HTTP")
+                get_link_cache().put(anime_session, episode_session, links)
+                return links
+            print("⚠️ No download links in play page markup, falling back to browser")
+        except requests.exceptions.RequestException as e:
+            print(f"⚠️ HTTP play page fetch failed: {e}, falling back to browser")
     
     for attempt in range(max_retries):
-        driver = None
+        check_cancelled(cancel_token)
         try:
             print(f"🌐 Scraping attempt {attempt + 1}/{max_retries} for {url}")
-            driver = create_stealth_driver(headless=True)
-            driver.get(url)
-            
-            # Wait for page to load
-            WebDriverWait(driver, 15).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            
-            # Look for download button
-            download_button = WebDriverWait(driver, 20).until(
-                EC.element_to_be_clickable((By.ID, "downloadMenu"))
-            )
-            
-            # Click download button
-            try:
-                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", download_button)
-                download_button.click()
-            except Exception as e:
-                print(f"⚠️ Direct click failed, trying guarded click: {e}")
-                guarded_click(driver, download_button, max_retries=3)
-            
-            # Wait for dropdown to appear
-            dropdown = WebDriverWait(driver, 20).until(
-                EC.visibility_of_element_located((By.ID, "pickDownload"))
-            )
-            
-            # Extract download links
-            anchors = dropdown.find_elements(By.TAG_NAME, "a")
-            links = {}
-            
-            for a in anchors:
-                href = a.get_attribute("href")
-                text = a.text.strip()
-                match = re.search(r"(\d{3,4})p", text)
-                if href and match:
-                    quality = match.group(1)
-                    if "eng" in text.lower():
-                        lang = "eng"
-                    elif "chi" in text.lower():
-                        lang = "chi"
-                    else:
-                        lang = "jpn"
-                    links[f"{quality}_{lang}"] = href
+            with SCRAPE_SECONDS.time(method="browser"), \
+                    get_driver_pool().driver() as driver, cancel_callback(cancel_token, driver.quit):
+                links = _scrape_play_page(driver, url)
             
             if links:
                 print(f"✅ Successfully scraped {len(links)} download links")
+                get_link_cache().put(anime_session, episode_session, links)
                 return links
             else:
                 print(f"⚠️ No download links found on attempt {attempt + 1}")
+                cause = "no_links"
+                
+        except DownloadCancelled:
+            raise
                 
         except TimeoutException as ex:
+            check_cancelled(cancel_token)
             print(f"⚠️ Timeout on attempt {attempt + 1}: {ex}")
             if attempt == max_retries - 1:
                 raise Exception(f"Page load timeout after {max_retries} attempts. The episode may not be available.")
+            cause = "timeout"
                 
         except Exception as ex:
+            check_cancelled(cancel_token)
             print(f"⚠️ Error on attempt {attempt + 1}: {ex}")
             if attempt == max_retries - 1:
                 raise Exception(f"Failed to scrape download links: {str(ex)}")
-                
-        finally:
-            if driver:
-                try:
-                    cleanup_browser_data(driver)  # Clean up temp directory first
-                    driver.quit()
-                except Exception as e:
-                    print(f"⚠️ Error closing driver: {e}")
+            cause = "error"
         
         # Wait before retry
         if attempt < max_retries - 1:
+            RETRIES.inc(operation="scrape", cause=cause)
             print(f"⏳ Waiting before retry...")
-            time.sleep(2 ** attempt + 1)  # Exponential backoff + 1 second minimum
+            cancellable_sleep(cancel_token, 2 ** attempt + 1)  # Exponential backoff + 1 second minimum
     
     return {}
 
 
+def scrape_download_links_batch(anime_session, episode_sessions, sm=None, use_cache=True, cancel_token=None,
+                                http_workers=None, max_retries=2):
+    """
+    Scrape many episodes of one series, yielding (episode_session, links, error)
+    as each one finishes. Cached episodes come first, then play pages are parsed
+    over HTTP a few at a time, and whatever is left is scraped in SCRAPER_TABS
+    tabs of a single pooled browser. Every result is written to the link cache.
+    """
+    cache = get_link_cache()
+    pending = []
+    for episode_session in dict.fromkeys(episode_sessions):
+        cached = cache.get(anime_session, episode_session) if use_cache else None
+        if cached:
+            yield episode_session, cached, None
+        else:
+            pending.append(episode_session)
+
+    def url_for(episode_session):
+        return f"{BASE_ORIGIN}/play/{anime_session}/{episode_session}"
+
+    if pending and sm is not None and SCRAPER_HTTP_ENABLED:
+        def fetch(episode_session):
+            check_cancelled(cancel_token)
+            with SCRAPE_SECONDS.time(method="http"):
+                return _scrape_play_page_http(sm, url_for(episode_session))
+
+        scraped = set()
+        workers = min(http_workers or QUALITIES_BATCH_HTTP_WORKERS, len(pending))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(fetch, episode_session): episode_session for episode_session in pending}
+            for future in as_completed(futures):
+                episode_session = futures[future]
+                try:
+                    links = future.result()
+                except requests.exceptions.RequestException as e:
+                    print(f"⚠️ HTTP play page fetch failed for {episode_session}: {e}")
+                    links = None
+                if links:
+                    cache.put(anime_session, episode_session, links)
+                    scraped.add(episode_session)
+                    yield episode_session, links, None
+        pending = [episode_session for episode_session in pending if episode_session not in scraped]
+
+    if not pending:
+        return
+    print(f"🌐 Scraping {len(pending)} episodes in tabs of one browser")
+    check_cancelled(cancel_token)
+    sessions_by_url = {url_for(episode_session): episode_session for episode_session in pending}
+    with get_driver_pool().driver() as driver, cancel_callback(cancel_token, driver.quit):
+        for url, links, error in scrape_play_pages_tabs(
+            driver, list(sessions_by_url), max_retries=max_retries, cancel_token=cancel_token
+        ):
+            episode_session = sessions_by_url[url]
+            if links:
+                cache.put(anime_session, episode_session, links)
+                yield episode_session, links, None
+            else:
+                yield episode_session, {}, error
@@ -0,0 +1,167 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from config import TITLE_INDEX_PATH, TITLE_INDEX_MIN_SCORE, SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_ENTRIES
+
+
+def normalize_query(text):
+    """Lowercase, drop punctuation and collapse whitespace, so "Naruto:  Shippuden" == "naruto shippuden\""""
+    return " ".join(re.sub(r"[^\w\s]", " ", (text or "").lower()).split())
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """
+    In-memory index of every series seen in a search response, keyed by session
+    and searchable by word prefix and trigram similarity. Persisted as JSON so
+    type-ahead works across restarts without touching the API.
+    """
+
+    def __init__(self, path=None, min_score=None):
+        self.path = path or TITLE_INDEX_PATH
+        self.min_score = min_score if min_score is not None else TITLE_INDEX_MIN_SCORE
+        self._lock = threading.Lock()
+        self._entries = {}  # session -> search result dict
+        self._normalized = {}  # session -> normalized title
+        self._gram_counts = {}  # session -> number of trigrams in the title
+        self._postings = {}  # trigram -> set of sessions
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        for entry in entries:
+            if entry.get("session") and entry.get("title"):
+                self._insert(entry)
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(list(self._entries.values()), f)
+        os.replace(tmp_path, self.path)
+
+    def _insert(self, entry):
+        session = entry["session"]
+        old = self._normalized.get(session)
+        title = normalize_query(entry["title"])
+        if old is not None and old != title:
+            for gram in _trigrams(old):
+                self._postings.get(gram, set()).discard(session)
+        self._entries[session] = entry
+        self._normalized[session] = title
+        grams = _trigrams(title)
+        self._gram_counts[session] = len(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(session)
+
+    def add(self, results):
+        """Index search result dicts (title, session, ...); saves only when something changed"""
+        with self._lock:
+            changed = False
+            for entry in results:
+                if not entry.get("session") or not entry.get("title"):
+                    continue
+                if self._entries.get(entry["session"]) != entry:
+                    self._insert(dict(entry))
+                    changed = True
+            if changed:
+                self._save()
+
+    def search(self, query, limit=10):
+        """
+        Best matching entries for `query`: titles with a word starting with the
+        query rank first, then titles by trigram (Jaccard) similarity.
+        """
+        text = normalize_query(query)
+        if not text:
+            return []
+        grams = _trigrams(text)
+        with self._lock:
+            shared = {}
+            for gram in grams:
+                for session in self._postings.get(gram, ()):
+                    shared[session] = shared.get(session, 0) + 1
+            scored = []
+            for session, count in shared.items():
+                title = self._normalized[session]
+                score = count / (len(grams) + self._gram_counts[session] - count)
+                if title.startswith(text) or f" {text}" in f" {title}":
+                    score += 1.0
+                if score >= self.min_score:
+                    scored.append((-score, title, session))
+            scored.sort()
+            return [dict(self._entries[session]) for _, _, session in scored[:limit]]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SearchCache:
+    """LRU cache of upstream search results keyed by normalized query, with a TTL"""
+
+    def __init__(self, ttl=None, max_entries=None):
+        self.ttl = ttl if ttl is not None else SEARCH_CACHE_TTL
+        self.max_entries = max_entries if max_entries is not None else SEARCH_CACHE_MAX_ENTRIES
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # normalized query -> (stored_at, results)
+
+    def get(self, query):
+        """Cached results for `query`, or None when missing or stale"""
+        key = normalize_query(query)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if time.monotonic() - item[0] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return list(item[1])
+
+    def put(self, query, results):
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(results))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_index = None
+_search_cache = None
+_lock = threading.Lock()
+
+
+def get_title_index():
+    """Get or create the process-wide title index"""
+    global _index
+    with _lock:
+        if _index is None:
+            _index = TitleIndex()
+        return _index
+
+
+def get_search_cache():
+    """Get or create the process-wide search result cache"""
+    global _search_cache
+    with _lock:
+        if _search_cache is None:
+            _search_cache = SearchCache()
+        return _search_cache
@@ -1,11 +1,15 @@
+import threading
 import time
 import urllib.parse
 import requests
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from config import BASE_ORIGIN
-from browser import create_stealth_driver, cleanup_browser_data
+from config import BASE_ORIGIN, CLEARANCE_PROBE_URL
+from browser import get_driver_pool, wait_for, apply_interception
+from cookie_store import get_clearance_jar, cookie_key
+from singleflight import SingleFlight
+from ratelimit import api_rate_limiter
+from metrics import DDOS_CLEAR_SECONDS, RETRIES
 
 
 def looks_like_ddos_guard(resp: requests.Response) -> bool:
@@ -20,39 +24,37 @@ def looks_like_ddos_guard(resp: requests.Response) -> bool:
 
 
 def wait_for_ddos_clear(driver, timeout=20):
+    with DDOS_CLEAR_SECONDS.time():
+        _wait_for_ddos_clear(driver, timeout)
+
+
+def _wait_for_ddos_clear(driver, timeout):
+    apply_interception(driver, "ddos")
     driver.get(BASE_ORIGIN)
-    try:
-        WebDriverWait(driver, 8).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='search'], input#search, .search"))
-        )
+    search_box = (By.CSS_SELECTOR, "input[type='search'], input#search, .search")
+    if wait_for(driver, EC.presence_of_element_located(search_box), 8, "ddos_search_box", required=False):
         return
-    except Exception:
-        pass
-    start = time.time()
-    while time.time() - start < timeout:
-        html = driver.page_source or ""
-        if "DDoS-Guard" not in html:
-            return
-        for c in driver.get_cookies():
-            if c.get("name", "").startswith("__ddg"):
-                return
-        time.sleep(1.0)
+    wait_for(driver, _ddos_cleared, timeout, "ddos_challenge", required=False)
 
 
-def get_requests_session_from_selenium():
-    driver = create_stealth_driver(headless=True)
-    print("🌐 Opening Animepahe…")
-    wait_for_ddos_clear(driver)
-    cookies = driver.get_cookies()
-    cleanup_browser_data(driver)  # Clean up temp directory
-    driver.quit()
+def _ddos_cleared(driver):
+    if "DDoS-Guard" not in (driver.page_source or ""):
+        return True
+    return any(c.get("name", "").startswith("__ddg") for c in driver.get_cookies())
+
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0.0.0 Safari/537.36"
+)
+
+
+def build_requests_session(cookies, user_agent=None):
+    """Create an API session carrying the given Selenium-style cookies"""
     sess = requests.Session()
     sess.headers.update({
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/124.0.0.0 Safari/537.36"
-        ),
+        "User-Agent": user_agent or DEFAULT_USER_AGENT,
         "Referer": BASE_ORIGIN + "/",
         "Accept": "application/json, text/javascript, */*; q=0.01",
         "X-Requested-With": "XMLHttpRequest",
@@ -63,25 +65,134 @@ def get_requests_session_from_selenium():
     return sess
 
 
+def get_requests_session_from_selenium():
+    with get_driver_pool().driver() as driver:
+        print("🌐 Opening Animepahe…")
+        wait_for_ddos_clear(driver)
+        cookies = driver.get_cookies()
+        try:
+            user_agent = driver.execute_script("return navigator.userAgent;")
+        except Exception:
+            user_agent = None
+    try:
+        get_clearance_jar().update(cookies, user_agent or DEFAULT_USER_AGENT)
+    except OSError as e:
+        print(f"⚠️ Could not save clearance cookies: {e}")
+    return build_requests_session(cookies, user_agent)
+
+
+def probe_session(sess):
+    """Cheap API call to check that a session's clearance is still accepted"""
+    try:
+        api_rate_limiter.acquire()
+        r = sess.get(CLEARANCE_PROBE_URL, timeout=10)
+    except requests.exceptions.RequestException:
+        return False
+    return r.status_code == 200 and not looks_like_ddos_guard(r)
+
+
+def get_requests_session_from_store():
+    """Rebuild a session from the shared clearance cookies, or None if they are missing or rejected"""
+    stored = get_clearance_jar().snapshot()
+    if not stored:
+        return None
+    sess = build_requests_session(stored["cookies"], stored["user_agent"])
+    if not probe_session(sess):
+        print("⚠️ Stored clearance cookies were rejected")
+        get_clearance_jar().clear()
+        return None
+    print("🍪 Reusing stored clearance cookies")
+    return sess
+
+
+def _session_cookies(sess):
+    return [
+        {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path, "expiry": c.expires}
+        for c in sess.cookies
+    ]
+
+
 class SessionManager:
     def __init__(self):
-        self.session = get_requests_session_from_selenium()
+        self._jar = get_clearance_jar()
+        self._sync_lock = threading.Lock()
+        self._refresh_flight = SingleFlight()
+        self.session = get_requests_session_from_store() or get_requests_session_from_selenium()
+        self._mark_synced(self.session)
 
-    def refresh_cookies(self):
+    def _mark_synced(self, session):
+        with self._sync_lock:
+            self._jar_version = self._jar.version
+            self._clearance_seen = {cookie_key(c): c["value"] for c in _session_cookies(session)}
+
+    def _pull_clearance(self, session):
+        """Take clearance a browser refreshed since this session last synced with the jar"""
+        if self._jar.version == self._jar_version:
+            return
+        stored = self._jar.snapshot()
+        for c in (stored["cookies"] if stored else []):
+            session.cookies.set(c["name"], c["value"], domain=c.get("domain"), path=c.get("path") or "/")
+        self._mark_synced(session)
+
+    def _push_clearance(self, session):
+        """Share clearance cookies the server issued to this session with every driver"""
+        cookies = _session_cookies(session)
+        with self._sync_lock:
+            seen = self._clearance_seen
+            self._clearance_seen = {cookie_key(c): c["value"] for c in cookies}
+        try:
+            self._jar.update(cookies, since=seen, clearance_only=True)
+        except OSError as e:
+            print(f"⚠️ Could not save clearance cookies: {e}")
+
+    def refresh_cookies(self, stale=None):
+        """
+        Replace the session with fresh clearance. Threads that hit DDoS-Guard at
+        the same time share one refresh, and a caller whose `stale` session has
+        already been replaced returns straight away.
+        """
+        self._refresh_flight.do("refresh", self._refresh, stale)
+
+    def _refresh(self, stale):
+        if stale is not None and self.session is not stale:
+            return
+        # A browser or another process may already have fresher clearance than ours
+        self._jar.reload()
+        stored = self._jar.snapshot()
+        current = {c.name: c.value for c in self.session.cookies}
+        if stored and any(current.get(c["name"]) != c["value"] for c in stored["cookies"]):
+            sess = get_requests_session_from_store()
+            if sess:
+                self.session = sess
+                self._mark_synced(sess)
+                return
+        self._jar.clear()
         print("🔄 Refreshing cookies via Selenium…")
-        self.session = get_requests_session_from_selenium()
+        sess = get_requests_session_from_selenium()
+        self.session = sess
+        self._mark_synced(sess)
 
     def get(self, url, **kwargs):
+        """GET through the cleared session, paced by the shared rate limiter"""
         try:
-            r = self.session.get(url, **kwargs)
+            session = self.session
+            self._pull_clearance(session)
+            api_rate_limiter.acquire()
+            r = session.get(url, **kwargs)
             if looks_like_ddos_guard(r):
                 print("🛑 DDoS page detected. Refreshing…")
-                self.refresh_cookies()
+                RETRIES.inc(operation="api", cause="ddos_guard")
+                self.refresh_cookies(stale=session)
+                api_rate_limiter.acquire()
                 r = self.session.get(url, **kwargs)
             elif r.status_code == 403:
                 print("🛑 403 Forbidden. Refreshing…")
-                self.refresh_cookies()
+                RETRIES.inc(operation="api", cause="forbidden")
+                self.refresh_cookies(stale=session)
+                api_rate_limiter.acquire()
                 r = self.session.get(url, **kwargs)
+            else:
+                self._push_clearance(session)
             return r
         except (requests.exceptions.ConnectTimeout, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
             print(f"🌐 Network error: {type(e).__name__}: {str(e)}")
@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import threading
+from config import TASK_STORE_PATH
+
+TASK_FIELDS = (
+    "task_id", "anime_session", "quality", "language", "download_directory", "status",
+    "progress", "current_episode", "total_episodes", "created_at", "completed_at", "error_message",
+    "batch_id",
+)
+EPISODE_FIELDS = (
+    "task_id", "episode", "episode_session", "state", "raw_url", "download_info",
+    "resolved_at", "bytes_done",
+)
+# Per-episode states, in pipeline order
+EPISODE_STATES = ("pending", "scraped", "resolved", "complete", "failed", "cancelled")
+
+
+class TaskStore:
+    """SQLite (WAL) store for download tasks and the per-episode progress of each"""
+
+    def __init__(self, path=None):
+        self.path = path or TASK_STORE_PATH
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " task_id TEXT PRIMARY KEY, anime_session TEXT, quality TEXT, language TEXT,"
+            " download_directory TEXT, status TEXT, progress REAL, current_episode REAL,"
+            " total_episodes INTEGER, created_at TEXT, completed_at TEXT, error_message TEXT,"
+            " batch_id TEXT)"
+        )
+        # Stores created before batch tasks were grouped lack the column
+        if "batch_id" not in {row["name"] for row in self._conn.execute("PRAGMA table_info(tasks)")}:
+            self._conn.execute("ALTER TABLE tasks ADD COLUMN batch_id TEXT")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS task_episodes ("
+            " task_id TEXT NOT NULL, episode REAL, episode_session TEXT NOT NULL,"
+            " state TEXT NOT NULL DEFAULT 'pending', raw_url TEXT, download_info TEXT,"
+            " resolved_at REAL, bytes_done INTEGER NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (task_id, episode_session))"
+        )
+        self._conn.commit()
+
+    def create_task(self, task, episodes):
+        """Insert a task row (dict of TASK_FIELDS) and a pending row for each episode dict"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO tasks ({', '.join(TASK_FIELDS)}) VALUES ({', '.join('?' * len(TASK_FIELDS))})",
+                [_to_db(task.get(name)) for name in TASK_FIELDS],
+            )
+            self._conn.executemany(
+                "INSERT INTO task_episodes (task_id, episode, episode_session) VALUES (?, ?, ?)",
+                [(task["task_id"], ep["episode"], ep["session"]) for ep in episodes],
+            )
+
+    def update_task(self, task_id, **fields):
+        fields = {k: v for k, v in fields.items() if k in TASK_FIELDS and k != "task_id"}
+        if not fields:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE tasks SET {', '.join(f'{k} = ?' for k in fields)} WHERE task_id = ?",
+                [_to_db(v) for v in fields.values()] + [task_id],
+            )
+
+    def update_episode(self, task_id, episode_session, **fields):
+        fields = {k: v for k, v in fields.items() if k in EPISODE_FIELDS[3:]}
+        if "download_info" in fields and fields["download_info"] is not None:
+            fields["download_info"] = json.dumps(fields["download_info"])
+        if not fields:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE task_episodes SET {', '.join(f'{k} = ?' for k in fields)}"
+                " WHERE task_id = ? AND episode_session = ?",
+                list(fields.values()) + [task_id, episode_session],
+            )
+
+    def get_task(self, task_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_tasks(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM tasks ORDER BY created_at").fetchall()
+        return [dict(row) for row in rows]
+
+    def unfinished_tasks(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM tasks WHERE status IN ('pending', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def episodes(self, task_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM task_episodes WHERE task_id = ? ORDER BY episode", (task_id,)
+            ).fetchall()
+        episodes = []
+        for row in rows:
+            ep = dict(row)
+            if ep["download_info"]:
+                ep["download_info"] = json.loads(ep["download_info"])
+            if ep["episode"] is not None and float(ep["episode"]).is_integer():
+                ep["episode"] = int(ep["episode"])
+            episodes.append(ep)
+        return episodes
+
+
+def _to_db(value):
+    # datetimes are stored as ISO strings so they round-trip through pydantic
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_task_store():
+    """Get or create the process-wide task store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TaskStore()
+        return _store
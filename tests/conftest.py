@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# Modules import from the repository root and read config at import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ANIME_DL_DATA_DIR", tempfile.mkdtemp(prefix="anime_dl_tests_"))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
@@ -0,0 +1,43 @@
+import urllib.parse
+
+import pytest
+import api_client
+import batch_queue
+
+
+class FakeSession:
+    """Answers m=release pages with one episode each; pages in `broken` always fail"""
+
+    def __init__(self, last_page, broken=()):
+        self.last_page = last_page
+        self.broken = set(broken)
+
+    def get(self, url, **kwargs):
+        page = int(urllib.parse.parse_qs(urllib.parse.urlparse(url).query)["page"][0])
+        data = {"last_page": self.last_page, "data": [{"episode": page, "session": f"ep{page}"}]}
+        return type("Response", (), {
+            "status_code": 503 if page in self.broken else 200,
+            "json": lambda self: data,
+        })()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(api_client, "EPISODE_PAGE_RETRIES", 1)
+    monkeypatch.setattr(api_client.time, "sleep", lambda seconds: None)
+
+
+def test_all_pages_are_collected():
+    assert [ep["episode"] for ep in api_client.get_all_episodes(FakeSession(3), "series")] == [1, 2, 3]
+
+
+def test_failed_page_is_reported_not_dropped():
+    with pytest.raises(api_client.EpisodeListIncomplete) as error:
+        api_client.get_all_episodes(FakeSession(4, broken={3}), "series")
+    assert error.value.pages == [3]
+
+
+def test_batch_plan_shows_an_incomplete_listing():
+    work, plan = batch_queue.plan_batch(FakeSession(2, broken={2}), [{"anime_session": "series"}])
+    assert work == {}
+    assert "page(s) 2 failed" in plan[0]["error"]
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+import httpx
+import main
+
+SCRAPE_SECONDS = 3
+
+
+def test_status_polls_stay_fast_while_a_scrape_runs(monkeypatch):
+    started = threading.Event()
+
+    def slow_scrape(anime_session, episode_session, **kwargs):
+        started.set()
+        time.sleep(SCRAPE_SECONDS)  # Blocks a browser executor thread like a real Selenium scrape
+        return {"720_eng": "https://pahe.win/a", "1080_jpn": "https://pahe.win/b"}
+
+    monkeypatch.setattr(main, "scrape_download_links", slow_scrape)
+    monkeypatch.setattr(main, "get_session_manager", lambda: None)
+    task_id = "responsiveness-test"
+    monkeypatch.setitem(main.download_tasks, task_id, main.DownloadTask(
+        task_id=task_id, status="running", progress=42.0, total_episodes=1, created_at=datetime.now()
+    ))
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            scrape = asyncio.ensure_future(client.post(
+                "/qualities", json={"anime_session": "series", "episode_session": "episode"}
+            ))
+            while not started.is_set():
+                await asyncio.sleep(0.01)
+
+            poll_times = []
+            for _ in range(5):
+                began = time.monotonic()
+                status = await client.get(f"/download/{task_id}")
+                poll_times.append(time.monotonic() - began)
+                assert status.status_code == 200
+                assert status.json()["progress"] == 42.0
+            assert not scrape.done()
+            return poll_times, await scrape
+
+    poll_times, scrape = asyncio.run(scenario())
+    assert max(poll_times) < 0.5
+    assert scrape.status_code == 200
+    assert scrape.json()["available_qualities"] == {"720": ["eng"], "1080": ["jpn"]}
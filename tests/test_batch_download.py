@@ -0,0 +1,89 @@
+import asyncio
+
+import httpx
+import main
+from batch_queue import work_key
+
+
+def _batch(owner_count):
+    """One work item wanted by `owner_count` tasks, laid out like the batch endpoint does"""
+    key = work_key("series", "ep1", "720", "eng", "./")
+    work = {key: {"episode": 1, "session": "ep1", "key": key, "anime_session": "series",
+                  "quality": "720", "language": "eng", "download_directory": "./", "title": "Series"}}
+    tasks, owners = [], {key: []}
+    for _ in range(owner_count):
+        task = main.create_task("series", [work[key]], "720", "eng", "./")
+        tasks.append((task, [key]))
+        owners[key].append(task.task_id)
+    return key, work, tasks, owners
+
+
+def _episode_state(task):
+    return main.task_store.episodes(task.task_id)[0]["state"]
+
+
+def _run(monkeypatch, key, work, tasks, owners, during):
+    """Run the batch with a pipeline that calls `during(shared)` before finishing the episode"""
+    seen = {}
+
+    def pipeline(*args, on_done=None, episode_tokens=None, **kwargs):
+        async def cancel_from_api():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+                return await asyncio.gather(*[client.delete(f"/download/{task.task_id}/episodes/1")
+                                              for task in during])
+        seen["responses"] = asyncio.run(cancel_from_api())
+        shared = episode_tokens[key]
+        seen["shared_cancelled"] = shared.cancelled
+        on_done(work[key], not shared.cancelled)
+        return [(work[key], not shared.cancelled)]
+
+    monkeypatch.setattr(main, "run_episode_pipeline", pipeline)
+    monkeypatch.setattr(main, "get_session_manager", lambda: None)
+    asyncio.run(main.download_batch_background("batch", tasks, work, owners))
+    assert all(response.status_code == 200 for response in seen["responses"])
+    return seen
+
+
+def test_cancelling_one_owner_keeps_the_episode_for_the_others(monkeypatch):
+    key, work, tasks, owners = _batch(2)
+    (first, _), (second, _) = tasks
+    seen = _run(monkeypatch, key, work, tasks, owners, during=[first])
+    assert not seen["shared_cancelled"]
+    assert _episode_state(first) == "cancelled"
+    assert _episode_state(second) == "complete"
+
+
+def test_episode_stops_once_every_owner_cancels_it(monkeypatch):
+    key, work, tasks, owners = _batch(2)
+    seen = _run(monkeypatch, key, work, tasks, owners, during=[task for task, _ in tasks])
+    assert seen["shared_cancelled"]
+    assert all(_episode_state(task) == "cancelled" for task, _ in tasks)
+
+
+def test_restart_resumes_batch_tasks_as_one_queue(monkeypatch):
+    key, work, tasks, owners = _batch(2)
+    for task, _ in tasks:
+        main.task_store.update_task(task.task_id, batch_id="restarted-batch", status="running")
+    main.task_store.update_episode(tasks[0][0].task_id, "ep1", state="scraped", raw_url="https://pahe.win/x")
+    batches, singles = [], []
+
+    async def fake_batch(batch_id, tasks, work, owners, **kwargs):
+        batches.append((batch_id, tasks, work, owners, kwargs))
+
+    async def fake_single(task_id, *args, **kwargs):
+        singles.append(task_id)
+
+    monkeypatch.setattr(main, "download_batch_background", fake_batch)
+    monkeypatch.setattr(main, "download_episodes_background", fake_single)
+
+    async def startup():
+        await main.resume_unfinished_tasks()
+        await asyncio.sleep(0)  # Let the scheduled resumes run
+
+    asyncio.run(startup())
+    [(batch_id, resumed, resumed_work, resumed_owners, kwargs)] = [b for b in batches if b[0] == "restarted-batch"]
+    assert list(resumed_work) == [key]
+    assert resumed_owners[key] == [task.task_id for task, _ in tasks]
+    assert [keys for _, keys in resumed] == [[key], [key]]
+    assert kwargs["resume"][key]["raw_url"] == "https://pahe.win/x"
+    assert not set(singles) & {task.task_id for task, _ in tasks}
@@ -0,0 +1,22 @@
+import batch_queue
+
+
+def test_jobs_differing_only_in_quality_get_distinct_files(monkeypatch):
+    monkeypatch.setattr(batch_queue, "get_all_episodes",
+                        lambda sm, anime_session: [{"episode": 1, "session": "ep1"}])
+    names = {}
+
+    def pipeline(anime_session, episodes, quality, language, filename_for=None, **kwargs):
+        for episode in episodes:
+            names[episode["key"]] = filename_for(episode)
+        return [(episode, True) for episode in episodes]
+
+    monkeypatch.setattr(batch_queue, "run_episode_pipeline", pipeline)
+    jobs = [
+        {"anime_session": "series", "title": "Series", "episodes": [1], "quality": quality, "download_directory": "./"}
+        for quality in ("720", "1080")
+    ]
+    plan, outcome = batch_queue.run_batch(None, jobs)
+    assert len(outcome) == 2
+    assert len(set(names.values())) == 2
+    assert names[plan[0]["keys"][0]] == "Series - Ep1 (720p eng)"
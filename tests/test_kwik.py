@@ -0,0 +1,76 @@
+import pytest
+from bench import FakeOrigin, pack_kwik
+from resolver import (
+    find_kwik_link,
+    decode_kwik_packed,
+    parse_kwik_form,
+    parse_kwik_title,
+    resolve_download_info_http,
+)
+
+FORM = (
+    '<form action="https://kwik.si/d/abc123" method="POST">'
+    '<input type="hidden" name="_token" value="tok&amp;en">'
+    '<input type="hidden" name="empty">'
+    '<button type="submit">Download</button></form>'
+)
+
+
+@pytest.fixture
+def origin():
+    fake = FakeOrigin(latency=0).start()
+    yield fake
+    fake.stop()
+
+
+def test_decode_packed_roundtrip():
+    page = f'<script>eval(function(h,u,n,t,e,r){{}}("{pack_kwik(FORM)}",12,"GjRbWzqHk",17,8,5))</script>'
+    assert decode_kwik_packed(page) == FORM
+
+
+def test_decode_packed_keeps_utf8():
+    markup = '<h1 class="title">Ep 1 – 日本語</h1>'
+    page = f'eval(function(h,u,n,t,e,r){{}}("{pack_kwik(markup)}",1,"GjRbWzqHk",17,8,1))'
+    assert decode_kwik_packed(page) == markup
+
+
+def test_decode_packed_without_script():
+    assert decode_kwik_packed("<html></html>") is None
+    assert decode_kwik_packed(None) is None
+
+
+def test_parse_form():
+    action, fields = parse_kwik_form(FORM)
+    assert action == "https://kwik.si/d/abc123"
+    assert fields == {"_token": "tok&en", "empty": ""}
+    assert parse_kwik_form("<div>no form</div>") == (None, {})
+
+
+def test_parse_title():
+    assert parse_kwik_title('<h1 class="title  main">Bench &amp; Co <b>01</b>.mp4</h1>') == "Bench & Co 01.mp4"
+    assert parse_kwik_title('<h1 class="title"> </h1>') is None
+    assert parse_kwik_title("<h1>untitled</h1>") is None
+
+
+def test_fake_origin_pages(origin):
+    intermediate = origin.intermediate_page("ep0001-720eng")
+    assert find_kwik_link(intermediate) == f"{origin.origin}/f/ep0001-720eng"
+
+    kwik = origin.kwik_page("ep0001-720eng")
+    action, fields = parse_kwik_form(decode_kwik_packed(kwik))
+    assert action == f"{origin.origin}/d/ep0001-720eng"
+    assert fields == {"_token": "bench-token"}
+    assert parse_kwik_title(kwik) == "Bench ep0001-720eng.mp4"
+
+
+def test_resolve_over_http(origin):
+    info = resolve_download_info_http(f"{origin.origin}/pahe/ep0001-720eng", timeout=5)
+    assert info["url"] == f"{origin.origin}/d/ep0001-720eng"
+    assert info["form_data"] == {"_token": "bench-token"}
+    assert info["cookies"].get("kwik_session") == "bench"
+    assert info["filename"] == "Bench_ep0001-720eng.mp4"
+    assert info["headers"]["Referer"] == f"{origin.origin}/f/ep0001-720eng"
+
+
+def test_resolve_over_http_unknown_markup(origin):
+    assert resolve_download_info_http(f"{origin.origin}/nothing-here", timeout=5) is None
@@ -0,0 +1,43 @@
+from conftest import read_fixture
+from scraper import parse_download_links, _link_key
+
+
+def test_parses_every_download_anchor():
+    links = parse_download_links(read_fixture("play_page.html"))
+    assert links == {
+        "360_jpn": "https://pahe.win/AAAA",
+        "720_jpn": "https://pahe.win/BBBB",
+        "1080_jpn": "https://pahe.win/CCCC",
+        "720_eng": "https://pahe.win/DDDD",
+        "1080_eng": "https://pahe.win/EEEE",
+        "480_chi": "https://pahe.win/FFFF",
+    }
+
+
+def test_ignores_anchors_after_dropdown_closes():
+    markup = (
+        '<div id="pickDownload"><a href="https://pahe.win/ok">Sub &middot; 1080p eng</a></div>'
+        '<div><a href="https://evil/y">Dub 1080p eng</a></div>'
+    )
+    assert parse_download_links(markup) == {"1080_eng": "https://pahe.win/ok"}
+
+
+def test_trailing_anchor_in_nested_container():
+    markup = (
+        '<div id="pickDownload"><div><div>'
+        '<a href="https://pahe.win/a">Sub &middot; 720p (100MB)</a>'
+        '</div></div><a href="https://pahe.win/b">Dub &middot; 720p <span>eng</span></a></div>'
+    )
+    assert parse_download_links(markup) == {"720_jpn": "https://pahe.win/a", "720_eng": "https://pahe.win/b"}
+
+
+def test_missing_dropdown_yields_nothing():
+    assert parse_download_links("<html><body><a href='x'>720p</a></body></html>") == {}
+    assert parse_download_links(None) == {}
+
+
+def test_link_key():
+    assert _link_key("SubsPlease · 720p (120MB) eng") == "720_eng"
+    assert _link_key("Chinese · 480p chi") == "480_chi"
+    assert _link_key("SubsPlease · 1080p") == "1080_jpn"
+    assert _link_key("No quality here") is None
@@ -0,0 +1,60 @@
+import progress
+from progress import TaskProgress
+
+MIB = 1024 * 1024
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def track(monkeypatch, **kwargs):
+    clock = FakeClock()
+    monkeypatch.setattr(progress.time, "monotonic", clock)
+    return clock, TaskProgress("task", 2, min_interval=0.5, alpha=0.3, **kwargs)
+
+
+def test_resumed_bytes_on_disk_are_not_throughput(monkeypatch):
+    clock, tracker = track(monkeypatch)
+    clock.now += 30  # scraping and resolving before the transfer starts
+    tracker.stage(1, "transferring")
+    done, total = 800 * MIB, 1200 * MIB
+    tracker.bytes(1, done, total)  # _CallbackProgress reports the .part size straight away
+    events = []
+    for _ in range(10):
+        clock.now += 1
+        done += 10 * MIB
+        events.append(tracker.bytes(1, done, total))
+    for event in events:
+        assert 9 * MIB < event["throughput"] < 11 * MIB
+    assert 29 < events[-1]["eta"] < 31  # 300 MiB left at ~10 MiB/s
+
+
+def test_restart_from_zero_is_not_negative_or_counted(monkeypatch):
+    clock, tracker = track(monkeypatch)
+    tracker.stage(1, "transferring")
+    tracker.bytes(1, 0, 100 * MIB)
+    for done in (10, 20, 30):
+        clock.now += 1
+        tracker.bytes(1, done * MIB, 100 * MIB)
+    clock.now += 1
+    restarted = tracker.bytes(1, 0, 100 * MIB)  # checksum mismatch or changed validator
+    assert restarted["throughput"] > 0
+    clock.now += 1
+    event = tracker.bytes(1, 10 * MIB, 100 * MIB)
+    assert event["throughput"] < 11 * MIB
+
+
+def test_stage_events_and_coalescing(monkeypatch):
+    clock, tracker = track(monkeypatch)
+    assert tracker.stage(1, "transferring")["stage"] == "transferring"
+    clock.now += 1
+    assert tracker.bytes(1, MIB, 10 * MIB) is not None
+    clock.now += 0.1
+    assert tracker.bytes(1, 2 * MIB, 10 * MIB) is None  # within min_interval
+    event = tracker.stage(1, "complete")
+    assert event["progress"] == 50.0
@@ -0,0 +1,17 @@
+import asyncio
+
+import main
+
+
+def test_startup_reloads_half_episodes_and_skips_bad_rows(monkeypatch):
+    half = main.create_task("series", [{"episode": 12.5, "session": "ep12-5"}], "720", "eng", "./")
+    main.task_store.update_task(half.task_id, status="completed", current_episode=12.5)
+    broken = main.create_task("series", [{"episode": 1, "session": "ep1"}], "720", "eng", "./")
+    main.task_store.update_task(broken.task_id, progress="not a number")
+    monkeypatch.setattr(main, "download_episodes_background", lambda *args, **kwargs: asyncio.sleep(0))
+    monkeypatch.setattr(main, "download_batch_background", lambda *args, **kwargs: asyncio.sleep(0))
+    main.download_tasks.clear()
+
+    asyncio.run(main.resume_unfinished_tasks())
+    assert main.download_tasks[half.task_id].current_episode == 12.5
+    assert broken.task_id not in main.download_tasks
@@ -0,0 +1,269 @@
+import json
+import os
+import threading
+import pytest
+import requests
+import transfer
+from bench import FakeOrigin, _TOKEN
+from cancel import check_cancelled
+
+SIZE = 4 * 1024 * 1024
+
+
+@pytest.fixture
+def origin(monkeypatch):
+    monkeypatch.setattr(transfer, "TRANSFER_MIN_SEGMENT_SIZE", 512 * 1024)
+    monkeypatch.setattr(transfer, "TRANSFER_BUFFER_SIZE", 64 * 1024)
+    monkeypatch.setattr(transfer, "cancellable_sleep", lambda token, seconds: check_cancelled(token))
+    fake = FakeOrigin(latency=0, file_size=SIZE, bandwidth=0).start()
+    yield fake
+    fake.stop()
+
+
+def _download_info(origin):
+    return {
+        "url": f"{origin.origin}/d/ep0001",
+        "form_data": {"_token": _TOKEN},
+        "filename": "ep.mp4",
+    }
+
+
+def _expected():
+    block = bytes(range(256)) * 256
+    return (block * (SIZE // len(block) + 1))[:SIZE]
+
+
+def _served(origin, respond):
+    """Route media requests through `respond(handler, default)` to script failures"""
+    handler = origin.server.RequestHandlerClass
+
+    class Scripted(handler):
+        def _file(self):
+            return respond(self, super()._file)
+
+    origin.server.RequestHandlerClass = Scripted
+
+
+def test_segmented_download_completes(origin, tmp_path):
+    assert transfer.advanced_download_with_progress(_download_info(origin), str(tmp_path), segments=4,
+                                                    progress_callback=lambda done, total: None)
+    assert (tmp_path / "ep.mp4").read_bytes() == _expected()
+    assert not os.path.exists(tmp_path / "ep.mp4.part.segments")
+
+
+def test_changed_file_restarts_from_scratch(origin, tmp_path):
+    changed = threading.Event()
+
+    def respond(handler, default):
+        if handler.headers.get("Range", "").startswith("bytes=0-") or changed.is_set():
+            return default()
+        changed.set()
+        handler.headers.replace_header("Range", "")  # Answer a whole-file 200, as for a changed copy
+        return default()
+
+    _served(origin, respond)
+    assert transfer.advanced_download_with_progress(_download_info(origin), str(tmp_path), segments=4,
+                                                    progress_callback=lambda done, total: None)
+    assert changed.is_set()
+    assert (tmp_path / "ep.mp4").read_bytes() == _expected()
+
+
+def test_failed_segment_stops_the_others(origin, tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, "TRANSFER_SEGMENT_RETRIES", 1)
+    origin.bandwidth = 2 * 1024 * 1024  # Slow enough that the healthy segments are still running
+    failed, later = threading.Event(), []
+
+    def respond(handler, default):
+        if not failed.is_set() and handler.headers.get("Range", "").startswith(f"bytes={SIZE // 2}-"):
+            failed.set()
+            handler.send_response(503)
+            handler.send_header("Content-Length", "0")
+            return handler.end_headers()
+        if failed.is_set():
+            later.append(handler.headers.get("Range"))
+        return default()
+
+    _served(origin, respond)
+    assert transfer.advanced_download_with_progress(_download_info(origin), str(tmp_path), segments=4,
+                                                    progress_callback=lambda done, total: None)
+    assert (tmp_path / "ep.mp4").read_bytes() == _expected()
+    # Healthy segments were stopped part-way, so the next round (after its probe) still had to finish them
+    resumed = later[later.index("bytes=0-0") + 1:]
+    assert any(int(r[len("bytes="):].split("-")[0]) < SIZE // 2 for r in resumed)
+
+
+def test_segment_offsets_saved_while_streaming(origin, tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, "TRANSFER_STATE_SAVE_BUFFERS", 1)
+    origin.bandwidth = 2 * 1024 * 1024
+    state_path = tmp_path / "ep.mp4.part.segments"
+    saved = []
+
+    def progress(done, total):
+        if not saved and done >= SIZE // 4:
+            saved.append(sum(seg[2] for seg in json.loads(state_path.read_text())["segments"]))
+
+    assert transfer.advanced_download_with_progress(_download_info(origin), str(tmp_path), segments=4,
+                                                    progress_callback=progress)
+    assert saved and saved[0] > 0
+
+
+# Single-stream transfers (segments=1): validated resume from .part and .part.meta
+
+HALF = SIZE // 2
+
+
+def _single(origin, tmp_path):
+    return transfer.advanced_download_with_progress(_download_info(origin), str(tmp_path), segments=1,
+                                                    progress_callback=lambda done, total: None)
+
+
+def _reply(handler, status, body=b"", headers=None, length=None):
+    handler.send_response(status)
+    handler.send_header("Content-Length", str(len(body) if length is None else length))
+    for name, value in (headers or {}).items():
+        handler.send_header(name, value)
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+def _recording(origin, respond=None):
+    """Serve media normally (or via `respond`) and record each request's Range and If-Range"""
+    seen = []
+
+    def record(handler, default):
+        seen.append((handler.headers.get("Range"), handler.headers.get("If-Range")))
+        if respond is not None:
+            result = respond(handler, default, len(seen))
+            if result is not NotImplemented:
+                return result
+        return default()
+
+    _served(origin, record)
+    return seen
+
+
+def _partial(tmp_path, data, validator='"bench"'):
+    (tmp_path / "ep.mp4.part").write_bytes(data)
+    (tmp_path / "ep.mp4.part.meta").write_text(json.dumps({"validator": validator, "size": SIZE}))
+
+
+def test_resume_sends_if_range_from_meta(origin, tmp_path):
+    _partial(tmp_path, _expected()[:HALF])
+    seen = _recording(origin)
+    assert _single(origin, tmp_path)
+    assert seen == [(f"bytes={HALF}-", '"bench"')]
+    assert (tmp_path / "ep.mp4").read_bytes() == _expected()
+    assert not os.path.exists(tmp_path / "ep.mp4.part.meta")
+
+
+def test_misplaced_content_range_restarts_from_scratch(origin, tmp_path):
+    _partial(tmp_path, _expected()[:HALF])
+
+    def respond(handler, default, count):
+        if count == 1:
+            # Claims to resume, but from the wrong offset
+            return _reply(handler, 206, _expected()[:HALF], {"Content-Range": f"bytes 0-{HALF - 1}/{SIZE}"})
+        return NotImplemented
+
+    seen = _recording(origin, respond)
+    assert _single(origin, tmp_path)
+    assert seen[1] == (None, None)
+    assert (tmp_path / "ep.mp4").read_bytes() == _expected()
+
+
+def test_whole_body_replaces_the_partial(origin, tmp_path):
+    _partial(tmp_path, b"\xff" * HALF, validator='"old copy"')
+
+    def respond(handler, default, count):
+        # If-Range no longer matches, so the origin sends the whole current file
+        del handler.headers["Range"]
+        return default()
+
+    _recording(origin, respond)
+    assert _single(origin, tmp_path)
+    assert (tmp_path / "ep.mp4").read_bytes() == _expected()
+
+
+def test_range_not_satisfiable_on_complete_part(origin, tmp_path):
+    _partial(tmp_path, _expected())
+    seen = _recording(origin, lambda handler, default, count: _reply(
+        handler, 416, headers={"Content-Range": f"bytes */{SIZE}"}))
+    assert _single(origin, tmp_path)
+    assert seen == [(f"bytes={SIZE}-", '"bench"')]
+    assert (tmp_path / "ep.mp4").read_bytes() == _expected()
+
+
+def test_digest_mismatch_discards_and_retries(origin, tmp_path):
+    good = "sha-256=:" + transfer.base64.b64encode(transfer.hashlib.sha256(_expected()).digest()).decode() + ":"
+    bad = "sha-256=:" + transfer.base64.b64encode(b"\0" * 32).decode() + ":"
+
+    def respond(handler, default, count):
+        return _reply(handler, 200, _expected(), {"Repr-Digest": bad if count == 1 else good})
+
+    seen = _recording(origin, respond)
+    assert _single(origin, tmp_path)
+    assert seen == [(None, None), (None, None)]  # The bad copy was not resumed
+    assert (tmp_path / "ep.mp4").read_bytes() == _expected()
+
+
+def test_early_eof_keeps_the_partial(origin, tmp_path):
+    def respond(handler, default, count):
+        if count == 1:
+            handler.close_connection = True
+            return _reply(handler, 200, _expected()[:HALF], {"ETag": '"bench"'}, length=SIZE)
+        return NotImplemented
+
+    seen = _recording(origin, respond)
+    assert _single(origin, tmp_path)
+    assert seen[1] == (f"bytes={HALF}-", '"bench"')
+    assert (tmp_path / "ep.mp4").read_bytes() == _expected()
+
+
+def test_complete_file_at_final_path_is_kept(origin, tmp_path):
+    (tmp_path / "ep.mp4").write_bytes(_expected())
+    seen = _recording(origin, lambda handler, default, count: _reply(
+        handler, 416, headers={"Content-Range": f"bytes */{SIZE}"}))
+    assert _single(origin, tmp_path)
+    assert seen == [(f"bytes={SIZE}-", None)]
+    assert (tmp_path / "ep.mp4").read_bytes() == _expected()
+
+
+def test_partial_file_at_final_path_is_resumed(origin, tmp_path):
+    (tmp_path / "ep.mp4").write_bytes(_expected()[:HALF])
+    seen = _recording(origin)
+    assert _single(origin, tmp_path)
+    assert seen == [(f"bytes={HALF}-", None), (f"bytes={HALF}-", '"bench"')]
+    assert (tmp_path / "ep.mp4").read_bytes() == _expected()
+
+
+def test_unconfirmed_file_at_final_path_is_left_alone(origin, tmp_path):
+    (tmp_path / "ep.mp4").write_bytes(_expected())
+    _recording(origin, lambda handler, default, count: _reply(handler, 410, b"link expired"))
+    assert not _single(origin, tmp_path)
+    assert (tmp_path / "ep.mp4").read_bytes() == _expected()
+    assert not os.path.exists(tmp_path / "ep.mp4.part")
+
+
+# copy_stream
+
+def test_copy_stream_reads_the_body_in_place(origin, tmp_path, monkeypatch):
+    with requests.get(f"{origin.origin}/files/ep0001.mp4", stream=True) as response:
+        # urllib3's read would allocate a bytes object per buffer; the plain body must not use it
+        monkeypatch.setattr(response.raw, "read", lambda *args, **kwargs: pytest.fail("urllib3 read used"))
+        with open(tmp_path / "copy", "wb") as file:
+            assert transfer.copy_stream(response, file, bytearray(64 * 1024)) == SIZE
+    assert (tmp_path / "copy").read_bytes() == _expected()
+
+
+def test_copy_stream_reports_broken_reads_as_network_errors(tmp_path):
+    class Body:
+        def readinto(self, view):
+            raise ConnectionResetError("reset by peer")
+
+    class Response:
+        headers = {}
+        raw = type("Raw", (), {"_fp": Body()})()
+
+    with open(tmp_path / "copy", "wb") as file, pytest.raises(requests.exceptions.RequestException) as error:
+        transfer.copy_stream(Response(), file, bytearray(16))
+    assert transfer._retry_cause(error.value) == "network"
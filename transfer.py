@@ -1,41 +1,527 @@
 import sys
 import time
 import os
+import json
+import base64
+import hashlib
+import re
+import threading
 import requests
-from time import sleep
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError, SSLError
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 from http.client import IncompleteRead
+from config import (
+    TRANSFER_SEGMENTS, TRANSFER_MIN_SEGMENT_SIZE, TRANSFER_SEGMENT_RETRIES,
+    TRANSFER_SEGMENT_RESTARTS, TRANSFER_STATE_SAVE_BUFFERS,
+    TRANSFER_BUFFER_SIZE, TRANSFER_PREALLOCATE, TRANSFER_DROP_CACHE, TRANSFER_HASH_ALGORITHM,
+)
+from scheduler import get_transfer_scheduler
+from cancel import CancelToken, DownloadCancelled, cancel_callback, cancellable_sleep, check_cancelled
+from metrics import TRANSFER_BYTES, TRANSFER_SECONDS, TRANSFER_THROUGHPUT, RETRIES
+
+
+# Digest header algorithm tokens -> hashlib names
+_DIGEST_ALGORITHMS = {'sha-512': 'sha512', 'sha-256': 'sha256', 'sha': 'sha1', 'md5': 'md5'}
+
+
+class ResumeMismatch(Exception):
+    """The server's copy no longer matches the partial file being resumed"""
+
+
+def _body_reader(response):
+    """
+    A readinto for the response body. Without content decoding it is the
+    underlying http.client response's, which fills the buffer in place; urllib3's
+    own readinto reads a new bytes object and copies it, so it is only used when
+    it has to decode.
+    """
+    raw = response.raw
+    fp = getattr(raw, '_fp', None)
+    encoding = (response.headers.get('content-encoding') or 'identity').strip().lower()
+    if encoding == 'identity' and hasattr(fp, 'readinto'):
+        return fp.readinto
+    raw.decode_content = True  # Same content decoding iter_content applies
+    return raw.readinto
+
+
+def _read_into(readinto, view, cancel_token):
+    """`readinto(view)` with errors translated the way iter_content does, so retry causes stay accurate"""
+    try:
+        return readinto(view)
+    except (ProtocolError, OSError, ReadTimeoutError, SSLError, DecodeError) as e:
+        check_cancelled(cancel_token)  # Closing the response to cancel can break a read in flight
+        if isinstance(e, ProtocolError):
+            raise requests.exceptions.ChunkedEncodingError(e)
+        if isinstance(e, SSLError):
+            raise requests.exceptions.SSLError(e)
+        if isinstance(e, DecodeError):
+            raise requests.exceptions.ContentDecodingError(e)
+        raise requests.exceptions.ConnectionError(e)  # Read timeouts and socket errors
+
+
+def copy_stream(response, file, buffer, limit=None, offset=0, on_chunk=None, cancel_token=None, hasher=None):
+    """
+    Copy a streamed response body into `file` by reading straight into the
+    reusable `buffer` (a bytearray), so a transfer costs one read/write pair per
+    buffer instead of a new bytes object per small chunk. Stops after `limit`
+    bytes when given. `offset` is where `file` is positioned, used to drop
+    written pages from the page cache when TRANSFER_DROP_CACHE is set.
+    `on_chunk(n)` runs after every write and `hasher` is updated with the
+    bytes written. Returns the number of bytes written.
+    """
+    readinto = _body_reader(response)
+    view = memoryview(buffer)
+    written = 0
+    while limit is None or written < limit:
+        want = len(view) if limit is None else min(len(view), limit - written)
+        count = _read_into(readinto, view[:want], cancel_token)
+        if not count:
+            break
+        check_cancelled(cancel_token)
+        file.write(view[:count])
+        if hasher is not None:
+            hasher.update(view[:count])
+        if TRANSFER_DROP_CACHE:
+            _drop_cache(file, offset + written, count)
+        written += count
+        if on_chunk:
+            on_chunk(count)
+    return written
+
+
+def _preallocate(file, size):
+    """Reserve `size` bytes on disk up front so parallel writes don't fragment the file"""
+    if not TRANSFER_PREALLOCATE or not hasattr(os, 'posix_fallocate'):
+        return
+    try:
+        os.posix_fallocate(file.fileno(), 0, size)
+    except OSError:
+        pass  # Not supported by this filesystem; the sparse file still works
+
+
+def _drop_cache(file, offset, length):
+    # Written episodes aren't read back, so keep them from evicting useful pages
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    file.flush()
+    try:
+        os.posix_fadvise(file.fileno(), offset, length, os.POSIX_FADV_DONTNEED)
+    except OSError:
+        pass
 
 
 def download_with_progress(session, url: str, filename: str):
-    with session.get(url, stream=True) as r:
+    scheduler = get_transfer_scheduler()
+    with scheduler.connection(url), session.get(url, stream=True) as r:
         r.raise_for_status()
         total = int(r.headers.get("content-length", 0))
         downloaded = 0
         start = time.time()
+
+        def report(count):
+            nonlocal downloaded
+            scheduler.throttle(count)
+            downloaded += count
+            elapsed = time.time() - start
+            speed = downloaded / (1024*1024) / elapsed if elapsed > 0 else 0
+            percent = (downloaded / total) * 100 if total else 0
+            eta = (total - downloaded) / (speed*1024*1024) if speed > 0 else 0
+            sys.stdout.write(
+                f"\r{filename} {percent:.2f}% "
+                f"{downloaded/1024/1024:.2f}MB/{total/1024/1024:.2f}MB "
+                f"{speed:.2f}MB/s ETA {eta:.1f}s"
+            )
+            sys.stdout.flush()
+
         with open(filename, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                if not chunk:
-                    continue
-                f.write(chunk)
-                downloaded += len(chunk)
-                elapsed = time.time() - start
-                speed = downloaded / (1024*1024) / elapsed if elapsed > 0 else 0
-                percent = (downloaded / total) * 100 if total else 0
-                eta = (total - downloaded) / (speed*1024*1024) if speed > 0 else 0
-                sys.stdout.write(
-                    f"\r{filename} {percent:.2f}% "
-                    f"{downloaded/1024/1024:.2f}MB/{total/1024/1024:.2f}MB "
-                    f"{speed:.2f}MB/s ETA {eta:.1f}s"
-                )
-                sys.stdout.flush()
+            copy_stream(r, f, bytearray(TRANSFER_BUFFER_SIZE), on_chunk=report)
     print("\n✅ Download complete:", filename)
 
 
-def advanced_download_with_progress(download_info, download_directory="./"):
+class _CallbackProgress:
+    """tqdm-compatible progress sink that reports (bytes_done, bytes_total) to a callback"""
+
+    def __init__(self, callback, total=None, initial=0):
+        self.callback = callback
+        self.total = total
+        self.n = initial
+        self._lock = threading.Lock()
+        callback(initial, total)
+
+    def update(self, n):
+        with self._lock:
+            self.n += n
+            done = self.n
+        self.callback(done, self.total)
+
+    def close(self):
+        pass
+
+
+def _make_progress(progress_callback, total, initial, desc):
+    """A tqdm bar for the CLI, or a callback sink when the caller tracks progress itself"""
+    if progress_callback is None:
+        return tqdm(total=total, unit='iB', unit_scale=True, unit_divisor=1024, initial=initial, desc=desc)
+    return _CallbackProgress(progress_callback, total, initial)
+
+
+def _parse_content_range(value):
+    """
+    Parse `bytes 100-199/1000` (or `bytes */1000`) into (start, end, total);
+    missing parts are None. Returns None when the header is absent or malformed.
+    """
+    match = re.match(r"bytes\s+(?:(\d+)-(\d+)|\*)/(\d+|\*)", value or '')
+    if not match:
+        return None
+    start, end, total = match.groups()
+    return (
+        int(start) if start is not None else None,
+        int(end) if end is not None else None,
+        int(total) if total != '*' else None,
+    )
+
+
+def _validator(headers):
+    """A strong ETag, else Last-Modified, for use in If-Range (weak ETags are not allowed there)"""
+    etag = headers.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('last-modified')
+
+
+def _expected_digest(headers, whole_body):
+    """
+    The (hashlib name, digest) the server vouches for via Repr-Digest/Digest,
+    or Content-MD5 when the response carries the whole file. (None, None) if absent.
+    """
+    for header in ('repr-digest', 'digest'):
+        for item in (headers.get(header) or '').split(','):
+            name, _, encoded = item.strip().partition('=')
+            algorithm = _DIGEST_ALGORITHMS.get(name.strip().lower())
+            if algorithm:
+                try:
+                    return algorithm, base64.b64decode(encoded.strip().strip(':'), validate=True)
+                except ValueError:
+                    continue
+    if whole_body and headers.get('content-md5'):
+        try:
+            return 'md5', base64.b64decode(headers['content-md5'], validate=True)
+        except ValueError:
+            pass
+    return None, None
+
+
+def _hash_prefix(path, length, algorithm, buffer):
+    """Hash the first `length` bytes of a partial file so a resumed stream can keep hashing"""
+    hasher = hashlib.new(algorithm)
+    view = memoryview(buffer)
+    with open(path, 'rb') as f:
+        while length > 0:
+            count = f.readinto(view[:min(len(view), length)])
+            if not count:
+                break
+            hasher.update(view[:count])
+            length -= count
+    return hasher
+
+
+def _adopt_legacy_partial(session, download_url, form_data, headers, full_file_path, part_path, cancel_token=None):
+    """
+    Older versions wrote straight to the final name, so a file there may be
+    finished or cut short. Ask the origin for the bytes past its end: a 416 (or
+    a whole body of the same length) means it is complete, and a 206 continuing
+    from its end means it is a partial that moves to the .part path for resuming.
+    Returns True when the file is complete, False when it is now a .part, and
+    None when the origin could not confirm either; the file is then left alone.
+    """
+    if os.path.exists(full_file_path + '.segments'):
+        # Preallocated by a segmented download, so its size says nothing
+        os.replace(full_file_path, part_path)
+        os.replace(full_file_path + '.segments', part_path + '.segments')
+        return False
+    size = os.path.getsize(full_file_path)
+    try:
+        with get_transfer_scheduler().connection(download_url, cancel_token), \
+                session.post(download_url, data=form_data, headers={**headers, 'Range': f"bytes={size}-"},
+                             stream=True, timeout=60) as response:
+            content_range = _parse_content_range(response.headers.get('content-range'))
+            length = response.headers.get('content-length')
+            if response.status_code == 416 and content_range and content_range[2] == size:
+                return True
+            if response.status_code == 200 and length and int(length) == size \
+                    and 'content-encoding' not in response.headers:
+                return True
+            if response.status_code == 206 and content_range and content_range[0] == size \
+                    and content_range[2] and content_range[2] > size:
+                os.replace(full_file_path, part_path)
+                _save_json(part_path + '.meta', {'validator': _validator(response.headers), 'size': content_range[2]})
+                return False
+            print(f"⚠️ Server answered {response.status_code} for the bytes after {full_file_path}")
+    except requests.exceptions.RequestException as e:
+        print(f"⚠️ Could not check {full_file_path} against the server: {e}")
+    return None
+
+
+def _load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _remove_files(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _record_transfer(mode, started, received):
+    elapsed = time.monotonic() - started
+    TRANSFER_SECONDS.observe(elapsed, mode=mode)
+    if elapsed > 0 and received:
+        TRANSFER_THROUGHPUT.observe(received / elapsed, mode=mode)
+
+
+def _retry_cause(error):
+    if isinstance(error, ResumeMismatch):
+        return "resume_mismatch"
+    if isinstance(error, IncompleteRead):
+        return "incomplete"
+    if isinstance(error, requests.exceptions.RequestException):
+        return "network"
+    return "error"
+
+
+def _probe_download(session, download_url, form_data, headers, cancel_token=None):
+    """
+    Issue a one-byte ranged request to learn the final media URL, total size,
+    whether the server honours Range and its If-Range validator.
+    Returns (final_url, total_size, ranged, validator).
+    """
+    probe_headers = {**headers, 'Range': 'bytes=0-0'}
+    with get_transfer_scheduler().connection(download_url, cancel_token), \
+            session.post(download_url, data=form_data, headers=probe_headers, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        final_url = response.url
+        content_range = _parse_content_range(response.headers.get('content-range'))
+        if response.status_code == 206 and content_range and content_range[0] == 0 and content_range[2]:
+            return final_url, content_range[2], True, _validator(response.headers)
+        return final_url, int(response.headers.get('content-length', 0)), False, None
+
+
+def _load_segment_state(state_path, total_size, validator):
+    state = _load_json(state_path)
+    # Offsets only make sense against the same copy of the file
+    if state and state.get('size') == total_size and state.get('validator') == validator and 'segments' in state:
+        return state['segments']
+    return None
+
+
+def _save_segment_state(state_path, total_size, validator, segments):
+    _save_json(state_path, {'size': total_size, 'validator': validator, 'segments': segments})
+
+
+def _segmented_download(session, download_url, form_data, headers, full_file_path, filename, segment_count,
+                        cancel_token=None, progress_callback=None):
+    """
+    Download a file over several concurrent range requests into a preallocated
+    `.part` file that is renamed into place once every segment is complete.
+    Each segment resumes independently from the offsets kept in a `.segments`
+    sidecar; every response must be a 206 for exactly the requested range, and
+    If-Range makes a changed file fail instead of mixing two copies.
+    When one segment gives up, the others are stopped and the transfer starts a
+    new round: from the saved offsets after exhausted retries, from scratch when
+    the file changed on the server.
+    Returns True/False for success/failure, or None when the server cannot do ranges.
+    """
+    part_path = full_file_path + '.part'
+    state_path = part_path + '.segments'
+    for round_number in range(TRANSFER_SEGMENT_RESTARTS + 1):
+        if os.path.exists(part_path) and not os.path.exists(state_path):
+            return None  # Partial single-stream download, let the caller resume it
+        try:
+            return _segmented_round(session, download_url, form_data, headers, part_path, full_file_path,
+                                    filename, segment_count, cancel_token, progress_callback)
+        except DownloadCancelled:
+            raise
+        except ResumeMismatch as e:
+            print(f"⚠️ File changed on the server, restarting {filename} from the beginning: {e}")
+            RETRIES.inc(operation="transfer", cause="resume_mismatch")
+            _remove_files(part_path, state_path)
+        except Exception as e:
+            print(f"⚠️ Segmented download of {filename} interrupted: {e}")
+            RETRIES.inc(operation="transfer", cause=_retry_cause(e))
+        # Stopped segments can leave half-read bodies on pooled connections; start the next round clean
+        session.close()
+        if round_number < TRANSFER_SEGMENT_RESTARTS:
+            cancellable_sleep(cancel_token, 2)
+    print(f"❌ Segmented download failed after {TRANSFER_SEGMENT_RESTARTS + 1} rounds: {filename}")
+    return False
+
+
+def _segmented_round(session, download_url, form_data, headers, part_path, full_file_path, filename, segment_count,
+                     cancel_token, progress_callback):
+    """
+    One pass of a segmented download. Returns True once the file is complete or
+    None when the server cannot do ranges; raises the first segment's error,
+    after stopping the others, when a segment gives up.
+    """
+    state_path = part_path + '.segments'
+    try:
+        final_url, total_size, ranged, validator = _probe_download(
+            session, download_url, form_data, headers, cancel_token
+        )
+    except requests.exceptions.RequestException as e:
+        if os.path.exists(state_path):
+            raise  # Segments are on disk; a single stream can't pick them up
+        print(f"⚠️ Range probe failed: {e}")
+        return None
+    if not ranged or total_size < TRANSFER_MIN_SEGMENT_SIZE * 2:
+        if os.path.exists(state_path):
+            _remove_files(part_path, state_path)  # Laid out for ranges; useless to a single stream
+        return None
+
+    # Once redirected to the media host, plain GETs are enough; otherwise re-POST the form
+    scheduler = get_transfer_scheduler()
+    if final_url != download_url:
+        def fetch(range_headers):
+            return session.get(final_url, headers={**headers, **range_headers}, stream=True, timeout=120)
+    else:
+        def fetch(range_headers):
+            return session.post(download_url, data=form_data, headers={**headers, **range_headers}, stream=True, timeout=120)
+
+    if validator:
+        headers = {**headers, 'If-Range': validator}
+
+    segments = _load_segment_state(state_path, total_size, validator)
+    if segments is None:
+        segment_count = max(1, min(segment_count, total_size // TRANSFER_MIN_SEGMENT_SIZE))
+        step = total_size // segment_count
+        segments = []
+        for i in range(segment_count):
+            start = i * step
+            end = total_size - 1 if i == segment_count - 1 else start + step - 1
+            segments.append([start, end, 0])  # [first byte, last byte, bytes done]
+        with open(part_path, 'wb') as f:
+            f.truncate(total_size)
+            _preallocate(f, total_size)
+        _save_segment_state(state_path, total_size, validator, segments)
+    else:
+        print(f"📄 Resuming {len(segments)} segments from {state_path}")
+
+    state_lock = threading.Lock()
+    done = sum(seg[2] for seg in segments)
+    progress = _make_progress(progress_callback, total_size, done, filename)
+    started = time.monotonic()
+    # Cancelled by the caller's token, or by the first segment that gives up so the rest stop too
+    stop = CancelToken(parent=cancel_token)
+    failures = []
+    save_every = TRANSFER_STATE_SAVE_BUFFERS * TRANSFER_BUFFER_SIZE
+
+    def run_segment(index):
+        seg = segments[index]
+        start, end = seg[0], seg[1]
+        attempts = TRANSFER_SEGMENT_RETRIES
+        buffer = bytearray(TRANSFER_BUFFER_SIZE)
+        unsaved = 0
+
+        def advance(count):
+            nonlocal unsaved
+            scheduler.throttle(count)
+            unsaved += count
+            with state_lock:
+                seg[2] += count
+                # Keep the sidecar close to the file so a crash loses little of this segment
+                if unsaved >= save_every:
+                    _save_segment_state(state_path, total_size, validator, segments)
+                    unsaved = 0
+            progress.update(count)
+            TRANSFER_BYTES.inc(count, mode="segmented")
+
+        while seg[2] < end - start + 1:
+            check_cancelled(stop)
+            position = start + seg[2]
+            try:
+                with scheduler.connection(final_url, stop), \
+                        fetch({'Range': f"bytes={position}-{end}"}) as response, \
+                        cancel_callback(stop, response.close):
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        # With If-Range, a full 200 means the file changed since the probe
+                        raise ResumeMismatch(f"Server answered {response.status_code} to a range request")
+                    content_range = _parse_content_range(response.headers.get('content-range'))
+                    if not content_range or content_range[0] != position or content_range[2] != total_size:
+                        raise ResumeMismatch(f"Unexpected Content-Range {response.headers.get('content-range')!r}")
+                    with open(part_path, 'r+b') as file:
+                        file.seek(position)
+                        written = copy_stream(response, file, buffer, limit=end - position + 1, offset=position,
+                                              on_chunk=advance, cancel_token=stop)
+                    check_cancelled(stop)
+                    if written < end - position + 1:
+                        raise IncompleteRead(b'', end - position + 1 - written)
+            except Exception as e:
+                attempts -= 1
+                with state_lock:
+                    _save_segment_state(state_path, total_size, validator, segments)
+                check_cancelled(stop)
+                if attempts <= 0 or isinstance(e, ResumeMismatch):
+                    failures.append(e)
+                    stop.cancel()
+                    raise
+                RETRIES.inc(operation="transfer_segment", cause=_retry_cause(e))
+                print(f"\n⚠️ Segment {index + 1}/{len(segments)} interrupted: {e}. Retrying...")
+                cancellable_sleep(stop, 2)
+        with state_lock:
+            _save_segment_state(state_path, total_size, validator, segments)
+        return True
+
+    # Leaving the executor waits for every segment, so none is still writing below
+    with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+        pending = [executor.submit(run_segment, index) for index in range(len(segments))]
+    progress.close()
+    if cancel_token is not None:
+        cancel_token.remove(stop.cancel)
+    if cancel_token is not None and cancel_token.cancelled:
+        print(f"🛑 Download cancelled, {len(segments)} segments saved for resume")
+        raise DownloadCancelled("Download cancelled")
+    if failures:
+        raise failures[0]
+    for future in pending:
+        if future.exception() is not None:
+            raise future.exception()
+    os.replace(part_path, full_file_path)
+    os.remove(state_path)
+    _record_transfer("segmented", started, total_size - done)
+    print(f"✅ Downloaded successfully ({len(segments)} segments): {full_file_path}")
+    return True
+
+
+def advanced_download_with_progress(download_info, download_directory="./", segments=None, cancel_token=None,
+                                    progress_callback=None):
     """
     Advanced download function with POST support, resume capability, and retry logic.
     Takes download_info dict from resolve_download_info function.
+    Large files are fetched over `segments` parallel range requests when the
+    server supports it (defaults to TRANSFER_SEGMENTS). Cancelling `cancel_token`
+    closes the open streams and raises DownloadCancelled; partial data is kept.
+    `progress_callback(bytes_done, bytes_total)` replaces the tqdm bar when given.
+
+    Data is written to `<filename>.part` and renamed into place when complete.
+    A resume is only appended when the server answers 206 with a matching
+    Content-Range (guarded by If-Range); anything else restarts the file. Short
+    bodies are retried from where they stopped, and the file is hashed while it
+    streams and checked against Repr-Digest/Digest/Content-MD5 when present.
     """
     if not download_info or not download_info.get('url'):
         print("❌ Invalid download information provided")
@@ -49,8 +535,11 @@ def advanced_download_with_progress(download_info, download_directory="./"):
     
     # Set the full file path
     full_file_path = os.path.join(download_directory, filename)
+    part_path = full_file_path + '.part'
+    meta_path = part_path + '.meta'  # Validator and size of the copy being resumed
     
-    # Create session and set cookies
+    # Create session and set cookies; connections and bandwidth are shared through the scheduler
+    scheduler = get_transfer_scheduler()
     session = requests.Session()
     for name, value in download_info.get('cookies', {}).items():
         session.cookies.set(name, value)
@@ -61,67 +550,154 @@ def advanced_download_with_progress(download_info, download_directory="./"):
 
     print(f"📥 Starting download: {filename}")
     print(f"🔗 Download URL: {download_url}")
-    
-    # Check if a partial file exists and resume download if possible
-    resume_header = {}
-    mode = 'wb'  # Write mode for new download
-    if os.path.exists(full_file_path):
-        existing_size = os.path.getsize(full_file_path)
-        if existing_size > 0:
-            resume_header = {'Range': f"bytes={existing_size}-"}
-            mode = 'ab'  # Append mode for partial download
-            print(f"📄 Resuming download from {existing_size} bytes")
 
+    if os.path.exists(full_file_path) and not os.path.exists(part_path):
+        complete = _adopt_legacy_partial(session, download_url, form_data, headers, full_file_path, part_path,
+                                         cancel_token)
+        if complete:
+            print(f"✅ Already downloaded: {full_file_path}")
+            return True
+        if complete is None:
+            print(f"❌ Keeping {full_file_path} as it is; it could not be checked against the server")
+            return False
+
+    if segments is None:
+        segments = TRANSFER_SEGMENTS
+    if segments > 1:
+        result = _segmented_download(session, download_url, form_data, headers, full_file_path, filename, segments,
+                                     cancel_token, progress_callback)
+        if result is not None:
+            return result
+        print("ℹ️ Falling back to a single download stream")
+    
+    buffer = bytearray(TRANSFER_BUFFER_SIZE)  # Reused across retries
     retries = 999  # Maximum number of retries for internet issues
     retry_delay = 10  # Time (in seconds) to wait before retrying
+    checksum_failures = 0
     downloaded = False
+    started = time.monotonic()
+    received = 0  # Bytes fetched by this call, across retries
 
     while not downloaded and retries > 0:
+        check_cancelled(cancel_token)
         try:
-            # Combine headers
-            request_headers = {**headers, **resume_header}
+            # Resume from whatever the .part file holds, if the server still has the same copy
+            current_size = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            meta = _load_json(meta_path) or {}
+            request_headers = dict(headers)
+            if current_size:
+                request_headers['Range'] = f"bytes={current_size}-"
+                if meta.get('validator'):
+                    request_headers['If-Range'] = meta['validator']
+                print(f"📄 Resuming download from {current_size} bytes")
             
-            with session.post(download_url, data=form_data, headers=request_headers, stream=True, timeout=120) as response:
+            with scheduler.connection(download_url, cancel_token), \
+                    session.post(download_url, data=form_data, headers=request_headers, stream=True, timeout=120) as response, \
+                    cancel_callback(cancel_token, response.close):
+                content_range = _parse_content_range(response.headers.get('content-range'))
+                if response.status_code == 416 and current_size:
+                    if content_range and content_range[2] == current_size == (meta.get('size') or current_size):
+                        # Everything was already received before the interruption
+                        os.replace(part_path, full_file_path)
+                        _remove_files(meta_path)
+                        print(f"✅ Downloaded successfully: {full_file_path}")
+                        return True
+                    raise ResumeMismatch(f"Range not satisfiable for {current_size} bytes on disk")
                 response.raise_for_status()
 
-                total_size = int(response.headers.get('content-length', 0))
-                current_size = os.path.getsize(full_file_path) if os.path.exists(full_file_path) else 0
-                
+                if current_size and response.status_code == 206:
+                    if not content_range or content_range[0] != current_size or (
+                            meta.get('size') and content_range[2] != meta['size']):
+                        raise ResumeMismatch(
+                            f"Unexpected Content-Range {response.headers.get('content-range')!r}"
+                        )
+                    mode = 'ab'
+                    expected_size = content_range[2]
+                else:
+                    # A 200 carries the whole (possibly changed) file; never append it
+                    if current_size:
+                        print("ℹ️ Server sent the whole file, restarting from the beginning")
+                    current_size = 0
+                    mode = 'wb'
+                    length = response.headers.get('content-length')
+                    expected_size = int(length) if length and 'content-encoding' not in response.headers else None
+
+                algorithm, expected_digest = _expected_digest(response.headers, whole_body=mode == 'wb')
+                algorithm = algorithm or TRANSFER_HASH_ALGORITHM
+                hasher = None
+                if algorithm:
+                    hasher = hashlib.new(algorithm) if mode == 'wb' else \
+                        _hash_prefix(part_path, current_size, algorithm, buffer)
+                _save_json(meta_path, {'validator': _validator(response.headers), 'size': expected_size})
+
                 # Initialize progress bar
-                progress = tqdm(
-                    total=total_size + current_size if total_size > 0 else None,
-                    unit='iB',
-                    unit_scale=True,
-                    unit_divisor=1024,
-                    initial=current_size,
-                    desc=filename
-                )
-
-                with open(full_file_path, mode) as file:
-                    for chunk in response.iter_content(chunk_size=1024):
-                        if chunk:
-                            file.write(chunk)
-                            progress.update(len(chunk))
+                progress = _make_progress(progress_callback, expected_size, current_size, filename)
+
+                def advance(count):
+                    nonlocal received
+                    scheduler.throttle(count)
+                    progress.update(count)
+                    received += count
+                    TRANSFER_BYTES.inc(count, mode="single")
+
+                with open(part_path, mode) as file:
+                    written = copy_stream(response, file, buffer, offset=current_size, on_chunk=advance,
+                                          cancel_token=cancel_token, hasher=hasher)
                 
                 progress.close()
+                check_cancelled(cancel_token)  # A closed stream can end the loop early
+                if expected_size is not None and current_size + written < expected_size:
+                    raise IncompleteRead(b'', expected_size - current_size - written)
+
+                if expected_digest is not None and hasher.digest() != expected_digest:
+                    _remove_files(part_path, meta_path)
+                    checksum_failures += 1
+                    print(f"❌ {algorithm} checksum mismatch for {filename}, discarded the download")
+                    RETRIES.inc(operation="transfer", cause="checksum")
+                    if checksum_failures > 1:
+                        return False
+                    continue
+
+                os.replace(part_path, full_file_path)
+                _remove_files(meta_path)
                 downloaded = True  # Download completed successfully
+                if hasher is not None:
+                    verified = " (verified)" if expected_digest is not None else ""
+                    print(f"🔒 {algorithm}: {hasher.hexdigest()}{verified}")
+                _record_transfer("single", started, received)
                 print(f"✅ Downloaded successfully: {full_file_path}")
                 return True
 
+        except ResumeMismatch as e:
+            # The partial data belongs to a different copy; start over without spending a retry
+            print(f"⚠️ Cannot resume {filename}: {e}. Restarting from the beginning")
+            RETRIES.inc(operation="transfer", cause="resume_mismatch")
+            _remove_files(part_path, meta_path)
+
+        except DownloadCancelled:
+            print(f"🛑 Download cancelled: {filename}")
+            raise
+
         except (requests.exceptions.RequestException, requests.exceptions.ChunkedEncodingError) as e:
+            check_cancelled(cancel_token)
             retries -= 1
+            RETRIES.inc(operation="transfer", cause="network")
             print(f"⚠️ Network error: {e}. Retrying in {retry_delay} seconds... ({retries} retries left)")
-            sleep(retry_delay)
+            cancellable_sleep(cancel_token, retry_delay)
 
         except IncompleteRead as e:
+            check_cancelled(cancel_token)
             print(f"⚠️ Incomplete download: {e}. Retrying...")
+            RETRIES.inc(operation="transfer", cause="incomplete")
             retries -= 1
-            sleep(retry_delay)
+            cancellable_sleep(cancel_token, retry_delay)
 
         except Exception as e:
+            check_cancelled(cancel_token)
             print(f"❌ Unexpected error: {e}")
+            RETRIES.inc(operation="transfer", cause="error")
             retries -= 1
-            sleep(retry_delay)
+            cancellable_sleep(cancel_token, retry_delay)
 
     if not downloaded:
         print(f"❌ Failed to download after multiple retries: {filename}")